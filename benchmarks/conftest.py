@@ -0,0 +1,58 @@
+"""
+Fixtures for the benchmarks.  The size of the synthetic history and the
+latency of the fake Gitlab server can be set with environment variables:
+
+    BENCH_ISSUES   number of issues (default 200)
+    BENCH_NOTES    notes per issue (default 20)
+    BENCH_LATENCY  seconds per API request (default 0)
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+from fake_gitlab import FakeGitlab
+
+N_ISSUES = int(os.environ.get('BENCH_ISSUES', 200))
+N_NOTES = int(os.environ.get('BENCH_NOTES', 20))
+LATENCY = float(os.environ.get('BENCH_LATENCY', 0))
+
+
+@pytest.fixture(scope='session')
+def fake_gitlab(tmp_path_factory):
+    """A running fake Gitlab server, with python-gitlab configured to use it."""
+    with FakeGitlab(N_ISSUES, N_NOTES, latency=LATENCY) as fake:
+        cfg = fake.config(tmp_path_factory.mktemp('gitlab') / 'python-gitlab.cfg')
+        old = os.environ.get('PYTHON_GITLAB_CFG')
+        os.environ['PYTHON_GITLAB_CFG'] = str(cfg)
+        yield fake
+        if old is None:
+            del os.environ['PYTHON_GITLAB_CFG']
+        else:
+            os.environ['PYTHON_GITLAB_CFG'] = old
+
+
+@pytest.fixture
+def run(monkeypatch, capsys):
+    """Run the rse_timetracking command line with the given arguments."""
+    from rse_timetracking import main
+
+    def run(*argv):
+        monkeypatch.setattr(sys, 'argv', ['rse_timetracking', *map(str, argv)])
+        main.main()
+        capsys.readouterr()   # The scrapers are chatty
+    return run
+
+
+@pytest.fixture(scope='session')
+def scraped(fake_gitlab, tmp_path_factory):
+    """Paths to a report.csv and a v2 pickle scraped from the fake server."""
+    from argparse import Namespace
+    from rse_timetracking.scrape import scrape
+    from rse_timetracking.scrape2 import scrape2
+    tmp = tmp_path_factory.mktemp('scraped')
+    csv, pkl = tmp / 'report.csv', tmp / 'report.pkl'
+    scrape(Namespace(output=csv, repo='rse-projects', trace=None))
+    scrape2(Namespace(output=pkl, repo='rse-projects', trace=None, jobs=1))
+    return dict(csv=csv, pkl=pkl)
@@ -0,0 +1,307 @@
+"""
+A local stand-in for the Gitlab REST API, serving a synthetic rse-projects
+repository.  Only the endpoints used by the scrapers are implemented.
+
+It can also be run by itself, to point the scrapers at it by hand:
+
+    python benchmarks/fake_gitlab.py --issues 200 --notes 20 --latency 0.01
+
+and then use the printed python-gitlab config file with PYTHON_GITLAB_CFG.
+"""
+from argparse import ArgumentParser
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+PROJECT_ID = 1
+PROJECT_PATH = 'AaltoRSE/rse-projects'
+
+UNITS = ['CS', 'NBE', 'PHYS', 'MATH', 'ELEC', 'General', 'AaltoSciComp', 'RSE']
+FUNDINGS = ['Unit', 'Project', 'ProjectOffers', 'ASC', 'Dedicated', 'ITS']
+STATUSES = ['0-Lead', '1-Waiting', '2-Queued', '3-InProgress', '3-Consulting',
+            '4-Review', '5-Reporting', '6-Done', '7-Maintenance', '8-Cancelled']
+SIZES = ['0-G', '1-S', '2-M', '3-L', 'x-NA']
+TASKS = ['SwDev', 'Workflow', 'WebDev', 'Data', 'HPC', 'Teaching']
+IMPS = ['1-Strategic', '1-Urgent', '1-Paying', '2-Deadline']
+OTHER_LABELS = ['a_Discuss', 'a_NoReport', 'Customer:FCAI', 'Customer:HouseOfAI']
+PEOPLE = ['Ada Lovelace', 'Alan Turing', 'Grace Hopper', 'Edsger Dijkstra',
+          'Barbara Liskov', 'Donald Knuth', 'Margaret Hamilton', 'Ken Thompson',
+          'Frances Allen', 'John Backus']
+SPEND = ['15m', '30m', '1h', '1h 30m', '2h', '3h', '4h', '1d', '2d', '1w']
+COMMENTS = [
+    'Had a meeting with the customer, they will send the data next week.',
+    'Pushed the first version to the repository.',
+    'The cluster job fails with an out of memory error, investigating.',
+    'changed the description',
+    'assigned to @someone',
+    'changed due date to March 3, 2021',
+    ]
+KPIS = ['/timesaved {}', '/projects {}', '/publications {}', '/software {}',
+        '/datasets {}', '/outputs {}']
+
+
+def _iso(t):
+    return t.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def generate(n_issues=100, n_notes=10, seed=0, start=datetime(2019, 1, 1, tzinfo=timezone.utc)):
+    """Generate a synthetic project.
+
+    Returns (issues, notes, time_stats): a list of issue dicts as returned by
+    the Gitlab API, and dicts iid -> list of note dicts and iid -> time stats.
+    """
+    rng = random.Random(seed)
+    issues = [ ]
+    notes = { }
+    time_stats = { }
+    for iid in range(1, n_issues+1):
+        created = start + timedelta(days=rng.randrange(0, 4*365),
+                                    seconds=rng.randrange(0, 86400))
+        labels = [
+            f'Unit::{rng.choice(UNITS)}',
+            f'Funding::{rng.choice(FUNDINGS)}',
+            f'Status::{rng.choice(STATUSES)}',
+            f'Size::{rng.choice(SIZES)}',
+            ]
+        labels += [f'Task:{t}' for t in rng.sample(TASKS, rng.randrange(0, 3))]
+        labels += [f'Imp:{t}' for t in rng.sample(IMPS, rng.randrange(0, 2))]
+        labels += rng.sample(OTHER_LABELS, rng.randrange(0, 2))
+        assignees = rng.sample(PEOPLE, rng.randrange(0, 3))
+
+        issue_notes = [ ]
+        total_spent = 0
+        t = created
+        for n in range(n_notes):
+            t = t + timedelta(hours=rng.randrange(1, 24*14))
+            author = rng.choice(assignees or PEOPLE)
+            kind = rng.random()
+            if n == n_notes - 1 and kind < 0.5:
+                body = 'closed'
+            elif kind < 0.5:
+                spent = rng.choice(SPEND)
+                day = (t - timedelta(days=rng.randrange(0, 3))).strftime('%Y-%m-%d')
+                body = f'added {spent} of time spent at {day}'
+                total_spent += _seconds(spent)
+            elif kind < 0.6:
+                kpi = rng.choice(KPIS)
+                body = kpi.format(rng.choice(SPEND) if kpi.startswith('/timesaved')
+                                  else rng.randrange(1, 5))
+            else:
+                body = rng.choice(COMMENTS)
+            issue_notes.append(dict(
+                id=iid*10000+n,
+                body=body,
+                author=dict(name=author, username=author.split()[0].lower()),
+                created_at=_iso(t),
+                updated_at=_iso(t),
+                system=body.startswith(('added', 'changed', 'assigned', 'closed')),
+                noteable_iid=iid,
+                ))
+        state = 'closed' if issue_notes and issue_notes[-1]['body'] == 'closed' else 'opened'
+        estimate = _seconds(rng.choice(SPEND)) * rng.randrange(0, 4)
+        issues.append(dict(
+            id=100000+iid,
+            iid=iid,
+            project_id=PROJECT_ID,
+            title=f'Project {iid}: {rng.choice(["data pipeline", "web app", "GPU port", "workflow", "course"])}',
+            description=(f'/summary Synthetic project number {iid}.\n'
+                         f'/contacts {rng.choice(PEOPLE).split()[0].lower()}@aalto.fi\n'
+                         f'Some more text describing the project.'),
+            state=state,
+            created_at=_iso(created),
+            updated_at=_iso(t),
+            closed_at=_iso(t) if state == 'closed' else None,
+            due_date=(created + timedelta(days=90)).strftime('%Y-%m-%d') if rng.random() < 0.3 else None,
+            labels=labels,
+            assignees=[dict(name=a, username=a.split()[0].lower()) for a in assignees],
+            time_stats=dict(time_estimate=estimate, total_time_spent=total_spent),
+            ))
+        notes[iid] = issue_notes
+        time_stats[iid] = dict(time_estimate=estimate, total_time_spent=total_spent,
+                               human_time_estimate=None, human_total_time_spent=None)
+    return issues, notes, time_stats
+
+
+def _seconds(spent):
+    # Avoid depending on the package under test for generating the data
+    units = dict(w=5*8*3600, d=8*3600, h=3600, m=60)
+    return sum(int(n) * units[u] for n, u in re.findall(r'(\d+)([wdhm])', spent))
+
+
+class FakeGitlab():
+    """A threaded HTTP server serving generated data on localhost.
+
+    latency: seconds to sleep before answering each request.
+    per_page: maximum page size (Gitlab's own maximum is 100).
+    """
+    def __init__(self, n_issues=100, n_notes=10, latency=0.0, seed=0, per_page=100):
+        self.issues, self.notes, self.time_stats = generate(n_issues, n_notes, seed=seed)
+        self.latency = latency
+        self.per_page = per_page
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def config(self, filename):
+        """Write a python-gitlab config file pointing at this server."""
+        with open(filename, 'w') as f:
+            f.write(f'[global]\ndefault = aalto\n\n'
+                    f'[aalto]\nurl = {self.url}\nprivate_token = fake-token\n'
+                    f'api_version = 4\n')
+        return filename
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def route(self, path, query):
+        """Return (status, data) for a GET request."""
+        base = f'/api/v4/projects/{PROJECT_ID}'
+        if path == '/api/v4/user':
+            return 200, dict(id=1, username='bench', name='Bench Mark')
+        if path == '/api/v4/search' and query.get('scope') == ['projects']:
+            return 200, [dict(id=PROJECT_ID, path_with_namespace=PROJECT_PATH)]
+        if path in (base, f'/api/v4/projects/{PROJECT_PATH.replace("/", "%2F")}'):
+            return 200, dict(id=PROJECT_ID, path_with_namespace=PROJECT_PATH)
+        if path == f'{base}/issues':
+            return 200, self.issues
+        m = re.fullmatch(base + r'/issues/(\d+)/(notes|time_stats)', path)
+        if m and int(m.group(1)) in self.notes:
+            iid = int(m.group(1))
+            if m.group(2) == 'notes':
+                return 200, self.notes[iid]
+            return 200, self.time_stats[iid]
+        return 404, dict(message='404 Not Found')
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                status, data = fake.route(url.path, query)
+                headers = { }
+                if isinstance(data, list):
+                    data, headers = fake._paginate(url, query, data)
+                self._reply(status, data, headers)
+
+            def do_POST(self):
+                fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if urlparse(self.path).path != '/api/graphql':
+                    return self._reply(404, dict(message='404 Not Found'))
+                request = json.loads(body)
+                self._reply(200, fake.graphql(request['query'], request['variables']))
+
+            def _reply(self, status, data, headers={}):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def graphql(self, query, variables):
+        """Answer the two queries of rse_timetracking.scrape_graphql.
+
+        This is not a GraphQL implementation: the page sizes are read from
+        the query, and cursors are just offsets.
+        """
+        if 'issue(iid:' in query:
+            iid = int(variables['iid'])
+            notes = self._connection(self.notes[iid], query, variables,
+                                     self._graphql_note)
+            return dict(data=dict(project=dict(issue=dict(notes=notes))))
+        first_notes = int(re.search(r'notes\(first: (\d+)', query).group(1))
+
+        def issue(i):
+            notes = self._connection(self.notes[i['iid']], f'first: {first_notes}',
+                                     dict(after=None), self._graphql_note)
+            return dict(
+                iid=str(i['iid']), title=i['title'], state=i['state'],
+                description=i['description'], createdAt=i['created_at'],
+                updatedAt=i['updated_at'], dueDate=i['due_date'],
+                timeEstimate=i['time_stats']['time_estimate'],
+                totalTimeSpent=i['time_stats']['total_time_spent'],
+                assignees=dict(nodes=[dict(username=a['username']) for a in i['assignees']]),
+                labels=dict(nodes=[dict(title=label) for label in i['labels']]),
+                notes=notes,
+                )
+        issues = self._connection(self.issues, query, variables, issue)
+        return dict(data=dict(project=dict(issues=issues)))
+
+    @staticmethod
+    def _graphql_note(n):
+        return dict(body=n['body'], system=n['system'], createdAt=n['created_at'],
+                    author=dict(name=n['author']['name']))
+
+    @staticmethod
+    def _connection(items, query, variables, convert):
+        first = int(re.search(r'first: (\d+)', query).group(1))
+        start = int(variables.get('after') or 0)
+        end = start + first
+        return dict(
+            pageInfo=dict(hasNextPage=end < len(items), endCursor=str(end)),
+            nodes=[convert(item) for item in items[start:end]],
+            )
+
+    def _paginate(self, url, query, data):
+        per_page = min(int(query.get('per_page', ['20'])[0]), self.per_page)
+        page = int(query.get('page', ['1'])[0])
+        total_pages = max(1, -(-len(data) // per_page))
+        headers = {'X-Page': str(page), 'X-Per-Page': str(per_page),
+                   'X-Total': str(len(data)), 'X-Total-Pages': str(total_pages)}
+        if page < total_pages:
+            headers['X-Next-Page'] = str(page + 1)
+            headers['Link'] = (f'<{self.url}{url.path}?page={page+1}&per_page={per_page}>; '
+                               f'rel="next"')
+        return data[(page-1)*per_page:page*per_page], headers
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--issues', type=int, default=100)
+    parser.add_argument('--notes', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--config', default='fake-gitlab.cfg')
+    args = parser.parse_args()
+    fake = FakeGitlab(args.issues, args.notes, latency=args.latency)
+    fake.config(args.config)
+    print(f'Serving {args.issues} issues at {fake.url}')
+    print(f'Use with: PYTHON_GITLAB_CFG={args.config} rse_timetracking scrape')
+    fake.server.serve_forever()
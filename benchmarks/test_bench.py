@@ -0,0 +1,82 @@
+"""
+End-to-end benchmarks against a fake Gitlab server.  Run with:
+
+    python -m pytest benchmarks/ --benchmark-autosave
+
+and compare against earlier runs with `--benchmark-compare`.  Peak Python
+memory (tracemalloc) and throughput are recorded in `extra_info` of each
+benchmark.
+"""
+import tracemalloc
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from conftest import N_ISSUES, N_NOTES, LATENCY
+
+
+def measure(benchmark, func, *args, rounds=3):
+    """Benchmark func(*args), and record throughput and peak memory."""
+    benchmark.extra_info.update(issues=N_ISSUES, notes=N_NOTES, latency=LATENCY)
+    tracemalloc.start()
+    result = func(*args)
+    benchmark.extra_info['peak_memory_MiB'] = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    benchmark.pedantic(func, args=args, rounds=rounds, iterations=1)
+    # No timings with --benchmark-disable, where this is only a smoke test
+    if benchmark.stats is not None:
+        benchmark.extra_info['issues_per_second'] = N_ISSUES / benchmark.stats.stats.mean
+    return result
+
+
+def test_scrape(benchmark, fake_gitlab, run, tmp_path):
+    measure(benchmark, run, 'scrape', '-o', tmp_path / 'report.csv')
+
+
+def test_scrape2(benchmark, fake_gitlab, run, tmp_path):
+    measure(benchmark, run, 'scrape', '--v2', '-o', tmp_path / 'report.pkl')
+
+
+def test_scrape2_graphql(benchmark, fake_gitlab, run, tmp_path):
+    measure(benchmark, run, 'scrape', '--v2', '--graphql', '-o', tmp_path / 'report.pkl')
+
+
+def test_halli(benchmark, fake_gitlab, run):
+    measure(benchmark, run, 'halli', '-n', 'Ada Lovelace', '-y', '2020', '-m', '3')
+
+
+def test_dataframes(benchmark, scraped):
+    from rse_timetracking.scrape2 import load, dataframes
+    projects = load(scraped['pkl'])
+    dfs = measure(benchmark, dataframes, projects)
+    assert len(dfs['df_projects']) == N_ISSUES
+
+
+def test_load(benchmark, scraped):
+    from rse_timetracking.scrape2 import load
+    projects = measure(benchmark, load, scraped['pkl'])
+    assert len(projects) == N_ISSUES
+
+
+def test_report(benchmark, scraped, run, tmp_path):
+    measure(benchmark, run, 'report', '-i', scraped['csv'], '-o', tmp_path / 'report.html')
+
+
+def spent_by_spender_and_funding(dfs):
+    """The groupby at the core of the reports."""
+    timespent = dfs['df_timespent'].join(dfs['df_projects']['funding'], on='iid')
+    return timespent.groupby(['spender', 'funding'], observed=True)['timespent_s'].sum()
+
+
+@pytest.mark.parametrize('dtype', [None, 'category', 'string[pyarrow]'])
+def test_dataframes_dtype(benchmark, scraped, dtype):
+    """Memory of the dataframes, and the spender × funding groupby, by text dtype."""
+    if dtype == 'string[pyarrow]':
+        pytest.importorskip('pyarrow')
+    from rse_timetracking.scrape2 import load, dataframes, STRING_COLUMNS
+    dfs = dataframes(load(scraped['pkl']), dtype=dtype)
+    benchmark.extra_info['dataframes_MiB'] = sum(
+        dfs[name].memory_usage(deep=True).sum() for name in STRING_COLUMNS) / 2**20
+    result = measure(benchmark, spent_by_spender_and_funding, dfs, rounds=20)
+    assert result.sum() == dfs['df_timespent']['timespent_s'].sum()
@@ -1,5 +1,6 @@
 from . import main
 
+# Light to import: scrape() imports pandas and python-gitlab when it runs
 from .scrape import scrape
 
 __version__ = '0.1'
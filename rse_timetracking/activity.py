@@ -0,0 +1,94 @@
+"""
+When projects were active: open periods of each project, and the number of
+active projects per day.
+
+A project is active from its creation until it is closed, and again from
+each reopening to the next close (the "closed" and "reopened" notes, in
+Project.event_list).  Time spent before the creation or after the last close
+extends the first or last period.
+
+    data = scrape2.dataframes(projects)
+    per_unit = activity.timeline(data['df_activity'], by='unit')
+"""
+from datetime import timedelta
+
+import pytz
+
+TZ = pytz.timezone('Europe/Helsinki')
+
+
+def intervals(p):
+    """Return the active periods [(start, end), ...] of a Project.
+
+    end is None if the project is still open.
+    """
+    result = [ ]
+    start = p.time_created
+    # Projects from before event_list was collected have no events
+    for event, time in sorted(getattr(p, 'event_list', [ ]), key=lambda e: e[1]):
+        if event == 'closed' and start is not None:
+            result.append((start, time))
+            start = None
+        elif event == 'reopened' and start is None:
+            start = time
+    if start is not None:
+        # Closed without a note we know of: the last update is the best guess
+        result.append((start, p.time_updated if p.state == 'closed' else None))
+    elif p.state != 'closed':
+        # Reopened without a note
+        result[-1] = (result[-1][0], None)
+
+    if p.time_spent_list:
+        times = [time for _, time, _, _ in p.time_spent_list]
+        first, last = min(times), max(times)
+        if first < result[0][0]:
+            result[0] = (first, result[0][1])
+        if result[-1][1] is not None and last > result[-1][1]:
+            result[-1] = (result[-1][0], last)
+    return result
+
+
+def _days(times):
+    """Local calendar days of a tz-aware datetime column, as naive dates."""
+    return times.dt.tz_convert(TZ).dt.tz_localize(None).dt.normalize()
+
+
+def timeline(df_activity, by=None, start=None, end=None):
+    """Number of active projects on each day.
+
+    df_activity: the 'df_activity' table of scrape2.dataframes().
+    by: a column of it ('unit', 'funding') to count separately, or None for
+    one 'active' column.  start, end: the range of days, by default from
+    the first start to today.
+
+    A sweep over the periods: each adds +1 on its first day and -1 on the day
+    after its last, and the cumulative sum of these over the days is the
+    count.  This is O((periods + days) log periods), instead of checking
+    every period on every day.
+
+    Returns a DataFrame with one row per day and one column per group, which
+    is empty if there are no periods.
+    """
+    import pandas as pd
+    if df_activity.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([ ], name='day'),
+                            columns=pd.Index([ ] if by else ['active'], name=by), dtype=int)
+    today = pd.Timestamp.now(TZ).tz_localize(None).normalize()
+    starts = _days(df_activity['start'])
+    ends = _days(df_activity['end']).fillna(today) + timedelta(days=1)
+    groups = (df_activity[by].fillna('None') if by
+              else pd.Series('active', index=df_activity.index))
+    deltas = pd.concat([
+        pd.DataFrame({'day': starts, 'group': groups, 'delta': 1}),
+        pd.DataFrame({'day': ends, 'group': groups, 'delta': -1}),
+        ])
+    deltas = deltas.groupby(['day', 'group'])['delta'].sum().unstack(fill_value=0)
+
+    start = pd.Timestamp(start) if start is not None else deltas.index.min()
+    end = pd.Timestamp(end) if end is not None else today
+    days = pd.date_range(min(start, deltas.index.min()), max(end, deltas.index.max()), freq='D')
+    counts = deltas.reindex(days, fill_value=0).cumsum()
+    counts = counts.loc[start:end]
+    counts.index.name = 'day'
+    counts.columns.name = by
+    return counts
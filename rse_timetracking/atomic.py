@@ -0,0 +1,43 @@
+"""
+Atomic file writes, for files which others may read at the same time.
+
+The data is written to a temporary file next to the target, which then
+replaces the target in one step (os.replace).  A reader sees either the old
+or the new file, never a partial one, and a reader which already opened the
+old file can finish reading it.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+# mkstemp makes files only readable by us; give them the usual permissions
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_write(filename, mode='wb'):
+    """Open a file for writing, which appears at `filename` when closed.
+
+    If the block raises, the target is left as it was.
+
+        with atomic_write('report.pkl') as f:
+            f.write(data)
+    """
+    filename = os.fspath(filename)
+    directory, name = os.path.split(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'.{name}.', suffix='.tmp')
+    try:
+        kwargs = dict(newline='') if 'b' not in mode else { }
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, filename)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,100 @@
+"""
+Read the projects from a Gitlab project export archive (Settings → General →
+Advanced → Export project), instead of going through the API.
+
+The archive is read as a stream: issues.ndjson is parsed one line (one issue
+with its notes) at a time, without unpacking the archive.  The issues go
+through the same scrape2.parse_issue() as the scrapers, so the output is the
+same.
+"""
+import json
+import sys
+import tarfile
+
+from .instrument import Stats
+from .scrape2 import parse_issue, save
+
+ISSUES = 'tree/project/issues.ndjson'
+MEMBERS = 'tree/project/project_members.ndjson'
+
+
+def import_export(args):
+    """Entrypoint of the `import-export` subcommand."""
+    stats = Stats()
+    with stats.phase('parse'):
+        projects = read_export(args.archive)
+    with stats.phase('serialize'):
+        save(projects, args.output)
+
+    # Thank you and goodbye!
+    print(f'\nData was written to: {args.output}')
+    stats.summary()
+    if args.trace:
+        stats.write_trace(args.trace)
+
+
+def read_export(archive):
+    """Stream the issues of an export archive into Project objects.
+
+    archive: a filename or a binary file object of the .tar.gz.
+    """
+    projects = [ ]
+    assignee_ids = { }    # iid -> user ids, resolved when members are known
+    usernames = { }       # user id -> username
+    found = False
+    kwargs = dict(fileobj=archive) if hasattr(archive, 'read') else dict(name=archive)
+    with tarfile.open(mode='r|*', **kwargs) as tar:
+        for member in tar:
+            name = member.name.lstrip('./')
+            if name == ISSUES:
+                found = True
+                for line in tar.extractfile(member):
+                    issue, time_stats, notes, assignees = _rest_issue(json.loads(line))
+                    print(f'{issue["iid"]:03d} {issue["title"][:75]:<75}', flush=True)
+                    projects.append(parse_issue(issue, time_stats, notes))
+                    assignee_ids[issue['iid']] = assignees
+            elif name == MEMBERS:
+                for line in tar.extractfile(member):
+                    user = json.loads(line).get('user') or { }
+                    usernames[user.get('id')] = user.get('username')
+            elif name == 'project.json':
+                sys.exit(f'{archive} is in the old export format (project.json), '
+                         f'which is not supported.  Make a new export.')
+    if not found:
+        sys.exit(f'No {ISSUES} in {archive}.  Is this a Gitlab project export?')
+
+    # The member list can come after the issues in the archive.
+    for p in projects:
+        p.assignee = ','.join(usernames.get(id_) or str(id_) for id_ in assignee_ids[p.iid])
+    return projects
+
+
+def _rest_issue(data):
+    """Convert an issue of the export to (issue, time_stats, notes, assignee ids).
+
+    The first three are in the form of the REST API, for parse_issue().
+    """
+    labels = [link['label']['title'] for link in data.get('label_links', [ ])
+              if link.get('label')]
+    issue = dict(
+        iid=data['iid'],
+        title=data['title'],
+        state=data['state'],
+        description=data.get('description'),
+        created_at=data['created_at'],
+        updated_at=data['updated_at'],
+        due_date=data.get('due_date'),
+        labels=labels,
+        assignees=[ ],
+        )
+    time_stats = dict(
+        time_estimate=data.get('time_estimate') or 0,
+        total_time_spent=sum(t['time_spent'] for t in data.get('timelogs', [ ])),
+        )
+    notes = [
+        dict(body=note['note'] or '', system=note.get('system'), created_at=note['created_at'],
+             author=dict(name=(note.get('author') or { }).get('name', 'Ghost User')))
+        for note in data.get('notes', [ ])
+        ]
+    assignees = [a['user_id'] for a in data.get('issue_assignees', [ ])]
+    return issue, time_stats, notes, assignees
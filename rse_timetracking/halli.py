@@ -1,19 +1,64 @@
+import calendar
+import csv
+import os
 import sys
+from collections import defaultdict
+from datetime import date, timedelta
 import dateutil
 import pytz
 import gitlab
 
 from .time import time_to_seconds, parse_time_spent
+from .instrument import Stats
+from .labels import classify
 
 TZ = pytz.timezone('Europe/Helsinki')
 
 
 def halli(args):
     """Main function that serves as the entrypoint to rse_timetracking."""
+    stats = Stats()
+
+    names = args.name or [ ]
+    batch = (len(names) != 1 or args.start or args.end or args.output
+             or args.output_dir or not args.month)
+    start, end = _date_range(args)
+
+    if args.data:
+        from .query import load_index
+        with stats.phase('load index'):
+            index = load_index(args.data)
+        with stats.phase('parse'):
+            hours, fundings = index_hours(index, names, start, end)
+    else:
+        hours, fundings = gitlab_hours(args, names, start, end, stats)
 
-    year = int(args.year)
-    month = int(args.month)
-
+    if not batch:
+        print_month(hours, fundings, names[0], start.year, start.month)
+    else:
+        if not names:
+            names = sorted(set(name for name, day in hours))
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            for name in names:
+                filename = os.path.join(args.output_dir, f'{name}.csv')
+                with open(filename, 'w', newline='') as f:
+                    write_csv(f, hours, fundings, [name], start, end)
+                print(f'Data was written to: {filename}', file=sys.stderr)
+        elif args.output:
+            with open(args.output, 'w', newline='') as f:
+                write_csv(f, hours, fundings, names, start, end)
+            print(f'Data was written to: {args.output}', file=sys.stderr)
+        else:
+            write_csv(sys.stdout, hours, fundings, names, start, end)
+
+    stats.summary()
+    if args.trace:
+        stats.write_trace(args.trace)
+
+
+def gitlab_hours(args, names, start, end, stats):
+    """Hours of collect_hours(), from the issues of the repo in Gitlab."""
     # Try to connect to gitlab
     gitlab_cfg_msg = """
     Could not connect to Gitlab.
@@ -35,15 +80,18 @@ def halli(args):
     except gitlab.config.ConfigError as err:
         sys.exit(f'{gitlab_cfg_msg}\n'
                  f'The error message that was raised was: {err}')
+    stats.attach(gl)
 
     try:
-        gl.auth()
+        with stats.phase('connect'):
+            gl.auth()
     except gitlab.GitlabAuthenticationError as err:
         sys.exit(f'Could not login to {gl.url}. Are you sure the access token '
                  f'is correct?\nThe error message that was raised was: {err}')
 
     # Find the correct repo
-    repo = gl.search('projects', args.repo)
+    with stats.phase('connect'):
+        repo = gl.search('projects', args.repo)
     if len(repo) == 0:
         sys.exit(f'Could not find {args.repo} on {gl.url}.')
     elif len(repo) > 1:
@@ -53,56 +101,143 @@ def halli(args):
             f'{repos}\nPlease use a more specific repository name.'
         )
     else:
-        repo = gl.projects.get(repo[0]['id'])
-
-    # Store time spent in dicts for each day
-    days = [{} for day in range(0, 31)]
+        with stats.phase('connect'):
+            repo = gl.projects.get(repo[0]['id'])
 
     # Now check all issues. Find funding type and time spent on each day.
-    for issue in repo.issues.list(all=True):
+    with stats.phase('list issues'):
+        issues = repo.issues.list(all=True)
+    return collect_hours(issues, names, start, end, stats)
+
+
+
+def _date_range(args):
+    """First and last date to report, from --start/--end or --year/--month."""
+    if args.start or args.end:
+        if not (args.start and args.end):
+            sys.exit('Both --start and --end are needed.')
+        return (dateutil.parser.parse(args.start).date(),
+                dateutil.parser.parse(args.end).date())
+    if not args.year:
+        sys.exit('Give the period with --year and --month, or --start and --end.')
+    year = int(args.year)
+    if not args.month:
+        return date(year, 1, 1), date(year, 12, 31)
+    month = int(args.month)
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def collect_hours(issues, names, start, end, stats):
+    """Bucket all time spent in one pass over the issues.
+
+    names: the people to include (all if empty).
+    start, end: first and last date to include.  Days are in Helsinki time.
 
-        # Check funding type
-        funding = "unknown"
-        for label in issue.labels:
-            try:
-                namespace, content = label.split('::')
+    Returns (hours, fundings): hours is a dict (name, date) -> {funding:
+    hours}, and fundings lists the funding types in the order they were
+    found.
+    """
+    names = set(names)
+    hours = defaultdict(lambda: defaultdict(float))
+    fundings = [ ]
+    for issue in issues:
+        with stats.phase('parse'):
+            # Check funding type
+            funding = "unknown"
+            for label in issue.labels:
+                namespace, content = classify(label)
                 if namespace == "Funding":
                     funding = content
-                    if funding not in days[0]:
-                        for day in range(0, 31):
-                            days[day][funding] = 0
-            except ValueError:
-                # Label doesn't follow namespace::content pattern
-                pass
-
-        # Check **all** notes and find time spent given month
-        for note in sorted(issue.notes.list(all=True), key=lambda x: x.created_at):
-            if note.author['name'] == args.name:
-                created_at = dateutil.parser.parse(note.created_at)
+            if funding not in fundings:
+                fundings.append(funding)
+
+            # Check **all** notes and find time spent in the date range
+            with stats.phase('fetch notes'):
+                notes = issue.notes.list(all=True)
+            spent = [ ]
+            for note in sorted(notes, key=lambda x: x.created_at):
+                # Removes all earlier time spent on the issue, of everyone,
+                # as in scrape2.parse_note()
+                if note.body == 'removed time spent':
+                    spent = [ ]
+                    continue
+                name = note.author['name']
+                if names and name not in names:
+                    continue
                 # Check the note for time spent
                 time_spent_parts = parse_time_spent(note.body)
-                if time_spent_parts is not None:
-                    if time_spent_parts[2]:
-                        created_at = TZ.localize(dateutil.parser.parse(time_spent_parts[2]))
-                    if created_at.year == year and created_at.month == month:
-                        time_spent = time_to_seconds(*time_spent_parts[:2])/3600
-                        days[created_at.day-1][funding] += time_spent
-
-    # For formatting: find funding types with non-zero time spent
-    nonzero_types = []
-    for index, records in enumerate(days):
-        for type, time in records.items():
-            if type not in nonzero_types and time > 0:
-                nonzero_types.append(type)
-
-    # Now print records for each day
-    for index, records in enumerate(days):
-        date = index+1
+                if time_spent_parts is None:
+                    continue
+                if time_spent_parts[2]:
+                    created_at = TZ.localize(dateutil.parser.parse(time_spent_parts[2]))
+                else:
+                    created_at = dateutil.parser.parse(note.created_at)
+                # Helsinki days, as in the index of a scraped file
+                day = created_at.astimezone(TZ).date()
+                if start <= day <= end:
+                    spent.append((name, day, time_to_seconds(*time_spent_parts[:2])/3600))
+            for name, day, time_spent in spent:
+                hours[name, day][funding] += time_spent
+    return hours, fundings
+
+
+def index_hours(index, names, start, end):
+    """The same as collect_hours(), from the index of a scraped file.
+
+    index: a query.Index, e.g. of the output of `scrape --v2`.
+
+    The records of each person are found by a binary search in the index,
+    so this reads only the records needed.  Days are in Helsinki time.
+    """
+    names = names or sorted(index.by_spender)
+    hours = defaultdict(lambda: defaultdict(float))
+    # The last Funding label, as collect_hours()
+    funding = {iid: p['funding_list'][-1] if p['funding_list'] else 'unknown'
+               for iid, p in index.projects.items()}
+    fundings = list(dict.fromkeys(funding.values()))
+    for name in names:
+        for day, iid, seconds in index.timesheet(name, start, end):
+            hours[name, day][funding[iid]] += seconds/3600
+    return hours, fundings
+
+
+def _days(start, end):
+    for n in range((end - start).days + 1):
+        yield start + timedelta(days=n)
+
+
+def _reported_types(hours, fundings, names, start, end):
+    """Funding types with non-zero time spent, which are not part of Base."""
+    nonzero = set()
+    for name in names:
+        for day in _days(start, end):
+            nonzero.update(f for f, t in hours.get((name, day), {}).items() if t > 0)
+    return [f for f in fundings if f in nonzero and f not in ["unknown", 'Unit']]
+
+
+def print_month(hours, fundings, name, year, month):
+    """Print the records for each day of one month, for one person."""
+    start = date(year, month, 1)
+    end = date(year, month, calendar.monthrange(year, month)[1])
+    types = _reported_types(hours, fundings, [name], start, end)
+    for day in _days(start, end):
+        records = hours.get((name, day), {})
         unallocated_time = 7.25
-        print(f"{date}: ", end="")
-        for type in nonzero_types:
-            time = records[type]
-            if type not in ["unknown", 'Unit']:
-                unallocated_time -= time
-                print(f"{type}={time} ", end="")
+        print(f"{day.day}: ", end="")
+        for type in types:
+            time = records.get(type, 0)
+            unallocated_time -= time
+            print(f"{type}={time} ", end="")
         print(f"Base={unallocated_time}")
+
+
+def write_csv(f, hours, fundings, names, start, end):
+    """Write one row per person and day: hours per funding type, and Base."""
+    types = _reported_types(hours, fundings, names, start, end)
+    writer = csv.writer(f)
+    writer.writerow(['name', 'date'] + types + ['Base'])
+    for name in names:
+        for day in _days(start, end):
+            records = hours.get((name, day), {})
+            row = [records.get(type, 0) for type in types]
+            writer.writerow([name, day.isoformat()] + row + [7.25 - sum(row)])
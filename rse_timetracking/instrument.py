@@ -0,0 +1,121 @@
+"""
+Instrumentation for the scrapers: wall time per phase, number of API requests
+and bytes received. Used to see where the time of a scrape goes (our own code
+or the Gitlab server).
+"""
+import json
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Functions called as f(event, phase) when any phase is entered ('enter') or
+# left ('exit'), e.g. by the profiler
+listeners = [ ]
+
+
+class Stats():
+    """Collects per-phase timings and API traffic of a single run.
+
+    Usage:
+
+        stats = Stats()
+        stats.attach(gl)             # count requests made through python-gitlab
+        with stats.phase('fetch notes'):
+            notes = issue.notes.list(all=True)
+        stats.summary()              # print a table to stderr
+        stats.write_trace('trace.json')
+    """
+    def __init__(self):
+        self.seconds = defaultdict(float)   # phase -> total wall time
+        self.count = defaultdict(int)       # phase -> times entered
+        self.requests = defaultdict(int)    # phase -> API requests
+        self.bytes = defaultdict(int)       # phase -> bytes received
+        self.events = [ ]                   # (phase, start, duration)
+        self._current = None
+        self._since = None
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Attribute the time (and API traffic) of the block to `name`.
+
+        Phases can nest: the time of an inner phase is not counted in the
+        outer one.
+        """
+        start = time.perf_counter()
+        outer = self._current
+        if outer is not None:
+            self.seconds[outer] += start - self._since
+        self._current, self._since = name, start
+        for listener in listeners:
+            listener('enter', name)
+        try:
+            yield
+        finally:
+            for listener in listeners:
+                listener('exit', name)
+            end = time.perf_counter()
+            self.seconds[name] += end - self._since
+            self.count[name] += 1
+            self.events.append((name, start - self._t0, end - start))
+            self._current, self._since = outer, end
+
+    def attach(self, gl):
+        """Count requests and bytes of a python-gitlab connection."""
+        gl.session.hooks['response'].append(self._on_response)
+
+    def _on_response(self, response, *args, **kwargs):
+        phase = self._current or 'other'
+        self.requests[phase] += 1
+        self.bytes[phase] += len(response.content or b'')
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self._t0
+
+    def summary(self, file=None):
+        """Print a summary table of all phases (to stderr by default)."""
+        if file is None:
+            file = sys.stderr
+        phases = list(self.seconds)
+        for phase in self.requests:
+            if phase not in phases:
+                phases.append(phase)
+        print(f'\n{"phase":<15} {"count":>7} {"seconds":>9} {"requests":>9} {"MiB":>9}',
+              file=file)
+        for phase in phases:
+            print(f'{phase:<15} {self.count[phase]:>7} {self.seconds[phase]:>9.2f} '
+                  f'{self.requests[phase]:>9} {self.bytes[phase]/2**20:>9.2f}',
+                  file=file)
+        print(f'{"total":<15} {"":>7} {self.total_seconds:>9.2f} '
+              f'{sum(self.requests.values()):>9} '
+              f'{sum(self.bytes.values())/2**20:>9.2f}',
+              file=file, flush=True)
+
+    def as_dict(self):
+        return dict(
+            total_seconds=self.total_seconds,
+            phases={
+                phase: dict(count=self.count[phase],
+                            seconds=self.seconds[phase],
+                            requests=self.requests[phase],
+                            bytes=self.bytes[phase])
+                for phase in set(self.seconds) | set(self.requests)
+                },
+            )
+
+    def write_trace(self, filename):
+        """Write a JSON trace.
+
+        The `traceEvents` list is in the Chrome trace event format, so the
+        file can be opened directly in chrome://tracing or Perfetto.
+        """
+        data = self.as_dict()
+        data['traceEvents'] = [
+            dict(name=name, ph='X', pid=0, tid=0,
+                 ts=int(start * 1e6), dur=int(duration * 1e6))
+            for name, start, duration in self.events
+            ]
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2)
@@ -0,0 +1,39 @@
+"""
+Classification of issue labels into our namespaces.
+
+Scoped labels look like `Unit::CS` and `Funding::Project`, and some simple
+ones like `Task:SwDev` and `Imp:1-Urgent`.  Everything else is a plain label.
+See the README for the list of labels.
+
+The same few hundred label strings repeat in every issue, so the result of
+each label is cached, and the values are interned: all projects share one
+string object per value (also after unpickling, since pickle stores a shared
+object only once).
+"""
+import sys
+
+# Namespaces of scoped labels (NAMESPACE::value)
+SCOPED = frozenset(['Unit', 'Size', 'Funding', 'Status'])
+# Namespaces of labels with a single colon (NAMESPACE:value)
+PREFIXED = frozenset(['Task', 'Imp'])
+
+_cache = { }
+
+
+def classify(label):
+    """Return (namespace, value) of a label.
+
+    For example, 'Unit::CS' -> ('Unit', 'CS') and 'Task:SwDev' -> ('Task',
+    'SwDev').  Labels not in one of our namespaces give (None, label).
+    """
+    try:
+        return _cache[label]
+    except KeyError:
+        pass
+    namespace, sep, value = label.partition('::')
+    if not (sep and namespace in SCOPED):
+        namespace, sep, value = label.partition(':')
+        if not (sep and namespace in PREFIXED) or value.startswith(':'):
+            namespace, value = None, label
+    result = _cache[label] = (namespace, sys.intern(value))
+    return result
@@ -1,32 +1,113 @@
 from argparse import ArgumentParser
+import os
 import sys
 
-from .scrape import scrape
-from .scrape2 import scrape2
-from .report import report
-from .halli import halli
+# The subcommands are imported only when they are run: they pull in pandas,
+# plotly and python-gitlab, which take seconds to import.
 
 
 def main():
     # Parse command line arguments
     parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--profile', metavar='PREFIX', default=None,
+                        help=('Profile CPU and memory use of the command, and '
+                              'write PREFIX.pstats and PREFIX.alloc.txt'))
+    parser.add_argument('--profile-top', type=int, default=25, metavar='N',
+                        help='Number of lines in the allocation report')
     sub_parsers = parser.add_subparsers(dest='command')
 
     # Scrape sub-command
     p_scrape = sub_parsers.add_parser('scrape', help='Scrape Gitlab')
-    p_scrape.add_argument('-o', '--output', default='report.csv',
+    p_scrape.add_argument('-o', '--output', default=None,
                           help=('The .csv file to write the scraped data to. '
-                                'Defaults to report.csv'))
+                                'Defaults to report.csv, and is needed with '
+                                '--partition'))
     p_scrape.add_argument('--repo', default='rse-projects',
                           help=('The name of the repository that tracks the '
                                 'projects. Defaults to AaltoRSE/rse-projects'))
     p_scrape.add_argument('--v2', action='store_true',
                           help=('Use new version'))
+    p_scrape.add_argument('--graphql', action='store_true',
+                          help=('With --v2: fetch everything through the '
+                                'GraphQL API, in far fewer requests'))
+    p_scrape.add_argument('--partition', action='store_true',
+                          help=('Write the output as a directory with one '
+                                'file per year'))
+    p_scrape.add_argument('-j', '--jobs', type=int, default=1,
+                          help=('With --v2: parse the issues in this many '
+                                'processes, while fetching the next ones. '
+                                'Defaults to 1'))
+    p_scrape.add_argument('--trace', default=None,
+                          help=('Write a JSON trace of per-phase timings and '
+                                'API traffic to this file'))
+
+    # Import-export sub-command
+    p_import = sub_parsers.add_parser(
+        'import-export', help='Read a Gitlab project export instead of scraping')
+    p_import.add_argument('archive',
+                          help='The project export .tar.gz file')
+    p_import.add_argument('-o', '--output', default='report.pkl',
+                          help=('The file to write the data to, in the same '
+                                'format as scrape --v2. Defaults to report.pkl'))
+    p_import.add_argument('--trace', default=None,
+                          help=('Write a JSON trace of per-phase timings to '
+                                'this file'))
+
+    # Serve-webhook sub-command
+    p_webhook = sub_parsers.add_parser(
+        'serve-webhook', help='Keep the data up to date from Gitlab webhooks')
+    p_webhook.add_argument('-i', '--input', default='report.pkl',
+                           help=('The file made by scrape --v2 to update. '
+                                 'Defaults to report.pkl'))
+    p_webhook.add_argument('-o', '--output', default=None,
+                           help='Write to this file instead of the input file')
+    p_webhook.add_argument('--host', default='127.0.0.1',
+                           help='Address to listen on. Defaults to 127.0.0.1')
+    p_webhook.add_argument('--port', type=int, default=8765,
+                           help='Port to listen on. Defaults to 8765')
+    p_webhook.add_argument('--secret', default=None,
+                           help=('The secret token of the webhook. Can also be '
+                                 'given in $WEBHOOK_SECRET'))
+    p_webhook.add_argument('--batch', type=int, default=20,
+                           help='Write after this many changes. Defaults to 20')
+    p_webhook.add_argument('--interval', type=float, default=10,
+                           help=('Write pending changes at least this often, '
+                                 'in seconds. Defaults to 10'))
+
+    # Query sub-command
+    p_query = sub_parsers.add_parser(
+        'query', help='Hours and projects matching filters, from an index')
+    p_query.add_argument('-i', '--input', default='report.pkl',
+                         help=('The file made by scrape --v2. '
+                               'Defaults to report.pkl'))
+    p_query.add_argument('--spender', action='append',
+                         help='Only time spent by this person (can be repeated)')
+    p_query.add_argument('--funding', action='append',
+                         help='Only projects with this funding (can be repeated)')
+    p_query.add_argument('--unit', action='append',
+                         help='Only projects of this unit (can be repeated)')
+    p_query.add_argument('--status', action='append',
+                         help='Only projects with this status (can be repeated)')
+    p_query.add_argument('--label', action='append',
+                         help=('Only projects with this label, e.g. Task:SwDev '
+                               '(can be repeated)'))
+    p_query.add_argument('--since', help='First date of time spent (YYYY-MM-DD)')
+    p_query.add_argument('--until', help='Last date of time spent (YYYY-MM-DD)')
+    p_query.add_argument('--kpi', action='append',
+                         help=('KPI threshold of projects, e.g. "timesaved>=1w" '
+                               '(can be repeated)'))
+    p_query.add_argument('--group-by',
+                         help=('Comma-separated fields to sum the hours by: '
+                               'spender, iid, unit, funding, status, year, '
+                               'month, day'))
+    p_query.add_argument('--projects', action='store_true',
+                         help='List the matching projects with their KPIs')
 
     # Report sub-command
     p_report = sub_parsers.add_parser('report', help='Build HTML report')
     p_report.add_argument('-i', '--input', default='report.csv',
-                          help=('The .csv file to read the statistics from. '
+                          help=('The .csv file (or directory, from scrape '
+                                '--partition) to read the statistics from. '
                                 'Defaults to report.csv'))
     p_report.add_argument('-o', '--output', default='report.html',
                           help=('The .html file to write the report to. '
@@ -34,29 +115,99 @@ def main():
     p_report.add_argument('-y', '--year', type=int, default=None,
                           help=('Restrict report to a specific year.'
                                 'Defaults to reporting on all years'))
+    p_report.add_argument('-j', '--jobs', type=int, default=None,
+                          help=('Number of processes rendering the figures. '
+                                'Defaults to one per figure'))
+    p_report.add_argument('--chunksize', type=int, default=None, metavar='ROWS',
+                          help=('Read the input in pieces of ROWS rows, to '
+                                'limit memory use on very large files'))
+    p_report.add_argument('--cache', metavar='DIR', default=None,
+                          help=('Keep rendered figures in DIR, and only render '
+                                'again those whose data changed'))
+
+    # Serve sub-command
+    p_serve = sub_parsers.add_parser('serve', help='Serve the report with filters')
+    p_serve.add_argument('-i', '--input', default='report.csv',
+                         help=('The .csv file (or scrape --partition directory) '
+                               'to read the statistics from. Defaults to report.csv'))
+    p_serve.add_argument('--host', default='127.0.0.1',
+                         help='Address to listen on. Defaults to 127.0.0.1')
+    p_serve.add_argument('--port', type=int, default=8000,
+                         help='Port to listen on. Defaults to 8000')
 
     # Halli sub-command
     p_halli = sub_parsers.add_parser('halli', help='Report hours spent for Halli')
     p_halli.add_argument('-m', '--month', help='The month as an integer')
     p_halli.add_argument('-y', '--year', help='The year as an integer')
-    p_halli.add_argument('-n', '--name', help='Your name')
+    p_halli.add_argument('-n', '--name', action='append',
+                         help=('Your name.  Can be given many times for batch '
+                               'mode, or left out to include everyone'))
+    p_halli.add_argument('--start', help='Batch mode: first date (YYYY-MM-DD)')
+    p_halli.add_argument('--end', help='Batch mode: last date (YYYY-MM-DD)')
+    p_halli.add_argument('-o', '--output',
+                         help='Batch mode: write one combined .csv file')
+    p_halli.add_argument('--output-dir',
+                         help=('Batch mode: write one NAME.csv file per '
+                               'person to this directory'))
     p_halli.add_argument('-i', '--input', help='Input file name',
                         default='report.csv')
+    p_halli.add_argument('--data',
+                         help=('Read the time spent from this output of '
+                               '`scrape --v2` (a file or a --partition '
+                               'directory) instead of Gitlab'))
     p_halli.add_argument('--repo', default='rse-projects',
                           help=('The name of the repository that tracks the '
                                 'projects. Defaults to AaltoRSE/rse-projects'))
+    p_halli.add_argument('--trace', default=None,
+                          help=('Write a JSON trace of per-phase timings and '
+                                'API traffic to this file'))
 
 
     args = parser.parse_args()
 
+    if args.profile:
+        from .profiling import Profiler
+        with Profiler(args.profile, top=args.profile_top):
+            run(parser, args)
+    else:
+        run(parser, args)
+
+
+def run(parser, args):
+    """Run the subcommand of the parsed args."""
     if args.command == 'scrape':
-        if args.v2:
+        if args.partition:
+            if args.output is None:
+                sys.exit('--partition needs the output directory with -o')
+            os.makedirs(args.output, exist_ok=True)
+        elif args.output is None:
+            args.output = 'report.csv'
+        if args.v2 and args.graphql:
+            from .scrape_graphql import scrape_graphql
+            scrape_graphql(args)
+        elif args.v2:
+            from .scrape2 import scrape2
             scrape2(args)
         else:
+            from .scrape import scrape
             scrape(args)
+    elif args.command == 'import-export':
+        from .export import import_export
+        import_export(args)
+    elif args.command == 'serve-webhook':
+        from .webhook import serve_webhook
+        serve_webhook(args)
+    elif args.command == 'query':
+        from .query import query
+        query(args)
     elif args.command == 'report':
+        from .report import report
         report(args)
+    elif args.command == 'serve':
+        from .serve import serve
+        serve(args)
     elif args.command == 'halli':
+        from .halli import halli
         halli(args)
     else:
         parser.print_help()
@@ -26,6 +26,7 @@ class Project():
         self.time_spent_list = [ ]
         self.kpi_list = [ ]
         self.metadata_list = [ ]
+        self.event_list = [ ]   # ('closed' or 'reopened', time)
 
     @property
     def unit(self):     return '+'.join(self.unit_list) or None
@@ -0,0 +1,225 @@
+"""
+Scraped data partitioned by year, so that reading one year does not read
+the whole history.
+
+With `scrape --partition`, the output is a directory instead of a file.
+For `scrape --v2` (and everything else which saves projects into an
+existing directory, e.g. `serve-webhook` and `import-export`):
+
+    DIR/manifest.json            format version, snapshot, years, and the year of each project
+    DIR/v3/projects-2021.pkl     projects whose year is 2021, without time spent
+    DIR/v3/timespent-2021.pkl    the time-spent records of 2021
+
+Each .pkl is in the format of scrape2.save().  scrape2.load(DIR, year=2021)
+reads the time spent of 2021, and only the projects it needs: those of
+2021, and those which had time spent in 2021.
+
+For `scrape` (v1), DIR/v3/2021.csv has the rows of report.csv whose time is
+in 2021 (UTC, as `report --year`), and `report -i DIR --year 2021` reads
+only that file.
+
+Every save writes a new snapshot directory (v1, v2, ...) and then replaces
+the manifest, which names the current snapshot, atomically.  Readers read
+the manifest once and then the files of its snapshot, so they never see a
+half-written save.  The previous KEEP snapshots stay, for readers which
+started before the save; older ones are removed.
+"""
+import copy
+import json
+import os
+import re
+import shutil
+import sys
+from datetime import date
+
+import pytz
+
+from .atomic import atomic_write
+
+TZ = pytz.timezone('Europe/Helsinki')
+
+# 1: partitions directly in DIR, 2: in snapshot directories
+FORMAT_VERSION = 2
+MANIFEST = 'manifest.json'
+KEEP = 2
+SNAPSHOT = re.compile(r'^v(\d+)$')
+PROJECTS = 'projects-{year}.pkl'
+TIMESPENT = 'timespent-{year}.pkl'
+PARTITION_FILE = re.compile(r'^(projects-|timespent-)?(\d{4})\.(pkl|csv)$')
+
+
+def date_range(year=None, start=None, end=None):
+    """(start, end) dates of a year, or the given dates; None is open."""
+    if year is not None:
+        return date(int(year), 1, 1), date(int(year), 12, 31)
+    return start, end
+
+
+def _years(start, end, available):
+    return [y for y in available
+            if (start is None or y >= start.year) and (end is None or y <= end.year)]
+
+
+def _in_range(time, start, end):
+    day = time.astimezone(TZ).date()
+    return (start is None or day >= start) and (end is None or day <= end)
+
+
+def _with_time_spent(p, records):
+    """A copy of the Project p with other time spent records."""
+    p = copy.copy(p)
+    # Project.__setstate__ shares the __dict__ of the original
+    p.__dict__ = dict(p.__dict__)
+    p.time_spent_list = records
+    return p
+
+
+def stamp(path):
+    """(size, mtime) of a scraped file or a partitioned directory, which
+    changes whenever it is saved again."""
+    if os.path.isdir(path):
+        # The manifest is written last on every save
+        path = os.path.join(path, MANIFEST)
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+def read_manifest(directory):
+    """The manifest of a partitioned directory, or None if there is none."""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest['version'] > FORMAT_VERSION:
+        sys.exit(f'{directory} is in format version {manifest["version"]}, which '
+                 f'is newer than this version of rse_timetracking.  Please upgrade.')
+    return manifest
+
+
+def _snapshot_dir(directory, manifest):
+    return os.path.join(directory, manifest.get('snapshot', ''))
+
+
+def _snapshots(directory):
+    """Numbers of the snapshot directories, in order."""
+    return sorted(int(m.group(1)) for m in map(SNAPSHOT.match, os.listdir(directory)) if m)
+
+
+def _new_snapshot(directory):
+    """Make the directory for the next snapshot, and return its name."""
+    snapshots = _snapshots(directory)
+    name = f'v{snapshots[-1] + 1 if snapshots else 1}'
+    os.mkdir(os.path.join(directory, name))
+    return name
+
+
+def _publish(directory, manifest, keep=KEEP):
+    """Make the snapshot of the manifest the current one, and clean up."""
+    with atomic_write(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+    current = int(SNAPSHOT.match(manifest['snapshot']).group(1))
+    for number in _snapshots(directory):
+        if number < current - keep:
+            shutil.rmtree(os.path.join(directory, f'v{number}'), ignore_errors=True)
+    # Partitions of the format version 1 layout
+    for name in os.listdir(directory):
+        if PARTITION_FILE.match(name):
+            os.remove(os.path.join(directory, name))
+
+
+def save_projects(projects, directory, compression=None):
+    """Write projects into a year-partitioned directory, as a new snapshot."""
+    from .scrape2 import save
+    by_year = { }
+    records = { }
+    for p in projects:
+        by_year.setdefault(p.year, [ ]).append(_with_time_spent(p, [ ]))
+        for record in p.time_spent_list:
+            records.setdefault(record[1].astimezone(TZ).year, [ ]).append(record)
+
+    snapshot = _new_snapshot(directory)
+    for year, partition in by_year.items():
+        save(partition, os.path.join(directory, snapshot, PROJECTS.format(year=year)), compression)
+    for year, partition in records.items():
+        save(partition, os.path.join(directory, snapshot, TIMESPENT.format(year=year)), compression)
+    _publish(directory, dict(
+        version=FORMAT_VERSION,
+        snapshot=snapshot,
+        project_years=sorted(by_year),
+        timespent_years=sorted(records),
+        projects=[[p.iid, p.year] for p in projects],
+        ))
+
+
+def load_projects(directory, start=None, end=None):
+    """Read the projects active between the dates from a partitioned directory.
+
+    Returns the projects of years in the range and those with time spent in
+    the range, with only the time spent in the range, in the saved order.
+    """
+    from .scrape2 import load
+    manifest = read_manifest(directory)
+    if manifest is None:
+        sys.exit(f'{directory} is not a partitioned directory (no {MANIFEST})')
+    snapshot = _snapshot_dir(directory, manifest)
+    project_year = dict((iid, year) for iid, year in manifest['projects'])
+
+    records = [ ]
+    for year in _years(start, end, manifest['timespent_years']):
+        records.extend(r for r in load(os.path.join(snapshot, TIMESPENT.format(year=year)))
+                       if _in_range(r[1], start, end))
+    active = set(r[0] for r in records)
+
+    years = set(_years(start, end, manifest['project_years']))
+    years.update(project_year[iid] for iid in active)
+    projects = { }
+    for year in sorted(years):
+        for p in load(os.path.join(snapshot, PROJECTS.format(year=year))):
+            if p.iid in active or _year_in_range(p.year, start, end):
+                projects[p.iid] = p
+    for record in records:
+        projects[record[0]].time_spent_list.append(record)
+    return [projects[iid] for iid, _ in manifest['projects'] if iid in projects]
+
+
+def _year_in_range(year, start, end):
+    return (start is None or year >= start.year) and (end is None or year <= end.year)
+
+
+def filter_projects(projects, start=None, end=None):
+    """The same selection as load_projects(), of projects in memory."""
+    if start is None and end is None:
+        return projects
+    result = [ ]
+    for p in projects:
+        records = [r for r in p.time_spent_list if _in_range(r[1], start, end)]
+        if records or _year_in_range(p.year, start, end):
+            result.append(_with_time_spent(p, records))
+    return result
+
+
+def save_csv(data, directory):
+    """Write the report.csv rows of each year (of 'time', in UTC) to YEAR.csv
+    files of a new snapshot."""
+    import pandas as pd
+    years = pd.to_datetime(data['time'], utc=True).dt.year
+    snapshot = _new_snapshot(directory)
+    for year, part in data.groupby(years):
+        part.to_csv(os.path.join(directory, snapshot, f'{year}.csv'), index=False)
+    _publish(directory, dict(
+        version=FORMAT_VERSION,
+        snapshot=snapshot,
+        years=sorted(int(year) for year in years.unique()),
+        ))
+
+
+def csv_files(directory, year=None):
+    """The YEAR.csv files of the current snapshot, only that of `year` if given."""
+    manifest = read_manifest(directory)
+    snapshot = directory if manifest is None else _snapshot_dir(directory, manifest)
+    names = sorted(name for name in os.listdir(snapshot)
+                   if PARTITION_FILE.match(name) and name.endswith('.csv'))
+    if year is not None:
+        names = [name for name in names if name == f'{year}.csv']
+    return [os.path.join(snapshot, name) for name in names]
@@ -0,0 +1,187 @@
+"""
+CPU and memory profiling of a whole run (`rse_timetracking --profile PREFIX
+COMMAND ...`).
+
+The run is done under cProfile and tracemalloc, and writes:
+
+- PREFIX.pstats: the CPU profile, for `python -m pstats` or snakeviz
+- PREFIX.alloc.txt: the lines that allocated most of the memory in use
+  when it was largest, and memory per phase
+
+Memory per phase uses the phases of instrument.Stats: the peak of Python
+allocations (tracemalloc) while in each phase, and the peak RSS of the
+process while in it.  RSS includes memory which tracemalloc does not see,
+such as numpy and pandas buffers.  It is sampled by a background thread
+every RSS_INTERVAL seconds (from /proc/self/statm; where that does not
+exist, the process-lifetime peak RSS is used instead).  The Python memory
+in use is only looked at between phases, and a snapshot of it is taken
+each time it has grown by 10%.
+
+Phases are tracked per thread (e.g. the pages of `serve`, which are made in
+many threads), so that threads do not end each other's phases.  Memory is
+of the whole process, so a phase which runs alongside others also counts
+their memory.
+"""
+import cProfile
+import linecache
+import os
+import sys
+import threading
+import tracemalloc
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+from . import instrument
+
+# Seconds between samples of the RSS
+RSS_INTERVAL = 0.01
+
+
+def current_rss():
+    """Resident set size of this process now, in bytes (or None)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss():
+    """Peak resident set size of this process so far, in bytes (or None)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives KiB, macOS bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Profiler():
+    """Profile a block of code, see the module docstring.
+
+    Usage:
+
+        with Profiler('prof'):
+            scrape2(args)
+    """
+    def __init__(self, prefix, top=25, frames=1):
+        self.prefix = prefix
+        self.top = top
+        self.frames = frames
+        self.peak = defaultdict(int)    # phase -> peak traced bytes
+        self.rss = { }                  # phase -> peak RSS while in it
+        # Thread id -> open phases, each [name, peak traced, peak RSS] so far
+        self._stacks = defaultdict(list)
+        self._total = [None, 0, None]
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._snapshot = None
+        self._snapshot_size = 0
+        self._snapshot_phase = None
+
+    def __enter__(self):
+        self._profile = cProfile.Profile()
+        tracemalloc.start(self.frames)
+        instrument.listeners.append(self._on_phase)
+        self._total = ['total', 0, self._rss()]
+        self._done.clear()
+        self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self._profile.disable()
+        instrument.listeners.remove(self._on_phase)
+        self._done.set()
+        self._sampler.join()
+        self._update(*tracemalloc.get_traced_memory())
+        self.peak['total'] = max([self._total[1]] + list(self.peak.values()))
+        self.rss['total'] = self._total[2]
+        tracemalloc.stop()
+        self._profile.dump_stats(self.prefix + '.pstats')
+        with open(self.prefix + '.alloc.txt', 'w') as f:
+            self.write_report(f)
+        print(f'\nProfile was written to: {self.prefix}.pstats, {self.prefix}.alloc.txt',
+              file=sys.stderr)
+        self.write_phases(sys.stderr)
+
+    @staticmethod
+    def _rss():
+        rss = current_rss()
+        return peak_rss() if rss is None else rss
+
+    def _sample_rss(self):
+        """Keep the largest RSS seen in each open phase (in a thread)."""
+        while not self._done.wait(RSS_INTERVAL):
+            self._update(0, 0)
+
+    def _update(self, current, peak):
+        """Fold the traced peak since the last call, and the RSS now, into
+        all open phases of all threads."""
+        rss = self._rss()
+        with self._lock:
+            phases = [self._total] + [phase for stack in self._stacks.values()
+                                      for phase in stack]
+            for phase in phases:
+                phase[1] = max(phase[1], peak)
+                if rss is not None:
+                    phase[2] = rss if phase[2] is None else max(phase[2], rss)
+            if current > self._snapshot_size * 1.1:
+                self._snapshot = tracemalloc.take_snapshot()
+                self._snapshot_size = current
+                return True
+        return False
+
+    def _on_phase(self, event, name):
+        """Called by Stats.phase() when entering and leaving a phase."""
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        if self._update(current, peak):
+            self._snapshot_phase = f'{event} {name}'
+        stack = self._stacks[threading.get_ident()]
+        with self._lock:
+            if event == 'enter':
+                stack.append([name, current, self._rss()])
+                return
+            # The innermost open phase of this name, in this thread
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i][0] == name:
+                    _, traced, rss = stack.pop(i)
+                    break
+            else:
+                return
+        self.peak[name] = max(self.peak[name], traced)
+        if rss is not None and self.rss.get(name) is not None:
+            rss = max(rss, self.rss[name])
+        self.rss[name] = rss
+
+    def write_phases(self, file):
+        print(f'\n{"phase":<15} {"peak MiB":>9} {"RSS MiB":>9}', file=file)
+        for phase in list(self.rss):
+            rss = self.rss[phase]
+            print(f'{phase:<15} {self.peak[phase]/2**20:>9.1f} '
+                  f'{"" if rss is None else format(rss/2**20, ".1f"):>9}', file=file)
+
+    def write_report(self, file):
+        snapshot = self._snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            ])
+        stats = snapshot.statistics('lineno')
+        total = sum(stat.size for stat in stats)
+        print(f'Largest memory in use: {total/2**20:.1f} MiB, at {self._snapshot_phase}',
+              file=file)
+        print(f'\nTop {self.top} lines:', file=file)
+        for stat in stats[:self.top]:
+            frame = stat.traceback[0]
+            print(f'{stat.size/2**20:>9.2f} MiB {stat.count:>9} blocks  '
+                  f'{frame.filename}:{frame.lineno}', file=file)
+            line = linecache.getline(frame.filename, frame.lineno).strip()
+            if line:
+                print(f'{"":>33}{line}', file=file)
+        print('\nBy phase:', file=file)
+        self.write_phases(file)
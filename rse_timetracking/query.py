@@ -0,0 +1,278 @@
+"""
+Ad-hoc queries over the scraped projects, without making the dataframes.
+
+The first query builds an index of the file made by `scrape --v2` and saves
+it next to it (FILE.index, or DIR/index.pkl in a partitioned directory).
+Later queries (and `halli --data`) only load the index, which is rebuilt
+automatically when the file changes.  The index has:
+
+- all time-spent records, sorted by date, as parallel lists
+- record positions by spender and by iid (also sorted by date, so the records
+  of one person in a period are a slice)
+- iids by unit, funding, status and label
+- per-project title and KPI sums
+
+Examples:
+
+    rse_timetracking query --funding Project --since 2021-01-01 --until 2021-03-31 --group-by spender
+    rse_timetracking query --kpi 'timesaved>1w' --projects
+"""
+import bisect
+import os
+import pickle
+import re
+import sys
+from collections import defaultdict
+from datetime import date
+
+import dateutil
+import pytz
+
+from . import kpis
+from . import partition
+from .atomic import atomic_write
+from .instrument import Stats
+from .time import time_to_seconds, human_time
+
+TZ = pytz.timezone('Europe/Helsinki')
+
+INDEX_VERSION = 2
+# File name of the index in a partitioned directory
+INDEX = 'index.pkl'
+
+GROUPS = ('spender', 'iid', 'unit', 'funding', 'status', 'year', 'month', 'day')
+
+KPI_TYPES = {kpi['name']: kpi['type'] for kpi in kpis.KPI_defs}
+
+KPI_EXPR = re.compile(r'^\s*(\w+)\s*(>=|<=|==|=|>|<)\s*(.+?)\s*$')
+OPERATORS = {
+    '>=': lambda a, b: a >= b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '<': lambda a, b: a < b,
+    '=': lambda a, b: a == b,
+    '==': lambda a, b: a == b,
+    }
+
+
+class Index():
+    """Indexes over the projects of one file, see the module docstring."""
+    def __init__(self, projects, source=None):
+        self.version = INDEX_VERSION
+        self.source = source
+
+        records = [ ]
+        for p in projects:
+            for iid, time_spentat, spender, timespent in p.time_spent_list:
+                records.append((time_spentat.astimezone(TZ).date().toordinal(),
+                                iid, spender, timespent.total_seconds()))
+        records.sort(key=lambda r: r[0])
+        self.dates = [r[0] for r in records]
+        self.iids = [r[1] for r in records]
+        self.spenders = [r[2] for r in records]
+        self.seconds = [r[3] for r in records]
+
+        self.by_spender = defaultdict(list)
+        self.by_iid = defaultdict(list)
+        for i, (iid, spender) in enumerate(zip(self.iids, self.spenders)):
+            self.by_spender[spender].append(i)
+            self.by_iid[iid].append(i)
+        self.by_spender = dict(self.by_spender)
+        self.by_iid = dict(self.by_iid)
+
+        self.projects = { }
+        self.by_unit = defaultdict(set)
+        self.by_funding = defaultdict(set)
+        self.by_status = defaultdict(set)
+        self.by_label = defaultdict(set)
+        for p in projects:
+            kpi_sums = defaultdict(int)
+            for name, value, _ in p.kpi_list:
+                kpi_sums[name] += value
+            self.projects[p.iid] = dict(title=p.title, unit=p.unit, funding=p.funding,
+                                        funding_list=list(p.funding_list),
+                                        status=p.status, kpis=dict(kpi_sums))
+            for value in p.unit_list:
+                self.by_unit[value].add(p.iid)
+            for value in p.funding_list:
+                self.by_funding[value].add(p.iid)
+            for value in p.status_list:
+                self.by_status[value].add(p.iid)
+            # Labels by their full name, e.g. Task:SwDev or a_Discuss
+            labels = ([f'Unit::{v}' for v in p.unit_list]
+                      + [f'Size::{v}' for v in p.size_list]
+                      + [f'Funding::{v}' for v in p.funding_list]
+                      + [f'Status::{v}' for v in p.status_list]
+                      + [f'Task:{v}' for v in p.task_list]
+                      + [f'Imp:{v}' for v in p.importance_list]
+                      + p.label_list)
+            for label in labels:
+                self.by_label[label].add(p.iid)
+        for name in ('by_unit', 'by_funding', 'by_status', 'by_label'):
+            setattr(self, name, dict(getattr(self, name)))
+
+    def save(self, filename):
+        with atomic_write(filename) as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def select_projects(self, units=(), fundings=(), statuses=(), labels=(), kpi_filters=()):
+        """iids of the projects matching all filters, or None for all.
+
+        Several values of the same filter match any of them.
+        """
+        selected = None
+        for index, values in ((self.by_unit, units), (self.by_funding, fundings),
+                              (self.by_status, statuses), (self.by_label, labels)):
+            if values:
+                matching = set().union(*(index.get(v, ()) for v in values))
+                selected = matching if selected is None else selected & matching
+        for name, op, threshold in kpi_filters:
+            matching = {iid for iid, p in self.projects.items()
+                        if name in p['kpis'] and OPERATORS[op](p['kpis'][name], threshold)}
+            selected = matching if selected is None else selected & matching
+        return selected
+
+    def select_records(self, iids=None, spenders=(), since=None, until=None):
+        """Positions of the time-spent records matching the filters."""
+        lo = 0 if since is None else bisect.bisect_left(self.dates, since.toordinal())
+        hi = len(self.dates) if until is None else bisect.bisect_right(self.dates, until.toordinal())
+        if spenders:
+            candidates = [self.by_spender.get(s, [ ]) for s in spenders]
+        elif iids is not None:
+            candidates = [self.by_iid.get(iid, [ ]) for iid in iids]
+        else:
+            return range(lo, hi)
+        # Positions are in date order, so the date range is a slice of each
+        positions = [ ]
+        for c in candidates:
+            positions.extend(c[bisect.bisect_left(c, lo):bisect.bisect_left(c, hi)])
+        if spenders and iids is not None:
+            positions = [i for i in positions if self.iids[i] in iids]
+        return sorted(positions)
+
+    def timesheet(self, spender, start=None, end=None):
+        """Time spent by one person: (date, iid, seconds) of each record.
+
+        A binary search and a slice of the records of that person, so this
+        does not depend on the amount of other data.
+        """
+        for i in self.select_records(spenders=[spender], since=start, until=end):
+            yield date.fromordinal(self.dates[i]), self.iids[i], self.seconds[i]
+
+    def group_key(self, i, group_by):
+        key = [ ]
+        for group in group_by:
+            if group == 'spender':
+                key.append(self.spenders[i])
+            elif group == 'iid':
+                key.append(self.iids[i])
+            elif group in ('unit', 'funding', 'status'):
+                key.append(self.projects[self.iids[i]][group])
+            else:
+                day = date.fromordinal(self.dates[i])
+                key.append(day.strftime(dict(year='%Y', month='%Y-%m', day='%Y-%m-%d')[group]))
+        return tuple(key)
+
+    def hours(self, positions, group_by=()):
+        """Sum of hours of the records, by the group_by fields."""
+        result = defaultdict(float)
+        for i in positions:
+            result[self.group_key(i, group_by)] += self.seconds[i] / 3600
+        return dict(result)
+
+
+def load_index(filename, index_filename=None):
+    """Load the index of a scraped file, (re)building it if needed."""
+    if index_filename is None:
+        # Inside a partitioned directory, next to a file
+        index_filename = (os.path.join(filename, INDEX) if os.path.isdir(filename)
+                          else str(filename) + '.index')
+    stamp = partition.stamp(filename)
+    try:
+        with open(index_filename, 'rb') as f:
+            index = pickle.load(f)
+        if index.version == INDEX_VERSION and index.source == stamp:
+            return index
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError):
+        pass
+    from .scrape2 import load
+    index = Index(load(filename), source=stamp)
+    index.save(index_filename)
+    return index
+
+
+def parse_kpi_filter(expr):
+    """'timesaved>1w' -> ('timesaved', '>', 144000)"""
+    m = KPI_EXPR.match(expr)
+    if not m or m.group(1) not in KPI_TYPES:
+        raise ValueError(f'Invalid KPI filter "{expr}", use e.g. "timesaved>=1w" '
+                         f'or "projects>0" (KPIs: {", ".join(sorted(KPI_TYPES))})')
+    name, op, value = m.groups()
+    if KPI_TYPES[name] == 'time':
+        value = time_to_seconds(value)
+    else:
+        value = float(value)
+    return name, op, value
+
+
+def _parse_date(value):
+    return dateutil.parser.parse(value).date() if value else None
+
+
+def query(args):
+    """Entrypoint of the `query` subcommand."""
+    try:
+        kpi_filters = [parse_kpi_filter(expr) for expr in args.kpi or [ ]]
+    except (ValueError, RuntimeError) as err:
+        sys.exit(str(err))
+    group_by = [g for g in (args.group_by or '').split(',') if g]
+    for group in group_by:
+        if group not in GROUPS:
+            sys.exit(f'Can not group by {group}, use some of: {",".join(GROUPS)}')
+
+    stats = Stats()
+    with stats.phase('load index'):
+        index = load_index(args.input)
+    with stats.phase('select'):
+        iids = index.select_projects(args.unit, args.funding, args.status, args.label,
+                                     kpi_filters)
+        positions = index.select_records(iids, args.spender, _parse_date(args.since),
+                                         _parse_date(args.until))
+
+    if args.projects:
+        # One row per matching project, with its hours in the selection
+        with stats.phase('aggregate'):
+            hours = index.hours(positions, ['iid'])
+        selected = sorted(index.projects if iids is None else iids)
+        if args.spender or args.since or args.until:
+            selected = [iid for iid in selected if (iid,) in hours]
+        names = sorted(set(name for iid in selected for name in index.projects[iid]['kpis']))
+        rows = [[iid, index.projects[iid]['title'][:50], round(hours.get((iid,), 0), 2)]
+                + [_format_kpi(name, index.projects[iid]['kpis'].get(name)) for name in names]
+                for iid in selected]
+        print_table(['iid', 'title', 'hours'] + names, rows)
+        return
+
+    with stats.phase('aggregate'):
+        hours = index.hours(positions, group_by)
+    rows = [list(key) + [round(value, 2)] for key, value in
+            sorted(hours.items(), key=lambda x: tuple(str(k) for k in x[0]))]
+    print_table(group_by + ['hours'], rows)
+
+
+def _format_kpi(name, value):
+    if value is None:
+        return ''
+    if KPI_TYPES[name] == 'time':
+        return human_time(value)
+    return value
+
+
+def print_table(header, rows, file=None):
+    """Print rows aligned in columns."""
+    file = file or sys.stdout
+    rows = [[('' if v is None else str(v)) for v in row] for row in rows]
+    widths = [max([len(h)] + [len(row[i]) for row in rows]) for i, h in enumerate(header)]
+    print('  '.join(h.ljust(w) for h, w in zip(header, widths)), file=file)
+    for row in rows:
+        print('  '.join(v.ljust(w) for v, w in zip(row, widths)), file=file)
@@ -1,12 +1,107 @@
+import hashlib
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
+import plotly
 import plotly.express as px
 
+from . import partition
+from .atomic import atomic_write
+from .instrument import Stats
+
+# Rendered figures to keep in the --cache directory
+CACHE_SIZE = 64
+
+# Month-end frequency alias, renamed from 'M' to 'ME' in pandas 2.2
+MONTH = 'ME' if tuple(int(x) for x in pd.__version__.split('.')[:2]) >= (2, 2) else 'M'
+
+# The figures of the report: name -> (plotly express function, its arguments,
+# arguments of to_html).  Each is made from the frame of the same name
+# returned by aggregate().
+FIGURES = dict(
+    time_per_unit=('pie', dict(
+        values='time_spent',
+        names='unit',
+        title='Time spent per unit',
+    ), dict(default_width=400, default_height=400)),
+    time_per_unit_per_month=('bar', dict(
+        x='time',
+        y='time_spent',
+        color='unit',
+        barmode='group',
+        title='Time spent per unit per month',
+        labels=dict(time_spent='time spent (days)', time='month'),
+    ), dict(default_width=1000, default_height=400)),
+    rse_time=('bar', dict(
+        x="RSE",
+        y="Time spent (%)",
+        color="Unit",
+        title="Time spent by each RSE"
+    ), dict(default_width=600, default_height=400)),
+    time_spent_vs_saved=('line', dict(
+        x='time',
+        y='value',
+        color='variable',
+        line_group='variable',
+        title="Time spent vs. time saved (for projects that track this information)",
+        labels=dict(time='date', value='time spent and saved (hours)'),
+    ), dict(default_width=600, default_height=400)),
+)
+
+
+# The columns of report.csv used by the report
+COLUMNS = ['iid', 'unit', 'time', 'author', 'time_spent', 'timesaved']
+
 
 def report(args):
-    data = pd.read_csv(args.input)
+    # A directory from scrape --partition: read only the year of the report
+    files = [args.input]
+    if os.path.isdir(args.input):
+        files = partition.csv_files(args.input, args.year)
+        if not files:
+            sys.exit(f'No data of {args.year or "any year"} in {args.input}')
 
+    stats = Stats()
+    if args.chunksize:
+        # Read the file in pieces, keeping only running sums in memory
+        with stats.phase('aggregate'):
+            chunks = (chunk for f in files
+                      for chunk in pd.read_csv(f, usecols=COLUMNS, chunksize=args.chunksize))
+            frames = aggregate_chunks(prepare(data, args.year) for data in chunks)
+    else:
+        with stats.phase('load'):
+            data = pd.concat([pd.read_csv(f, usecols=COLUMNS) for f in files],
+                             ignore_index=True)
+            data = prepare(data, args.year)
+        with stats.phase('aggregate'):
+            frames = aggregate(data)
+
+    with stats.phase('render'):
+        figures = render_all(frames, jobs=args.jobs, cache_dir=args.cache)
+
+    template = r'''
+    <html>
+    <head>
+      <meta charset="utf-8" />
+      <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    </head>
+    <body>
+      <h1>RSE statistics</h1>
+      {time_per_unit}
+      {time_per_unit_per_month}
+      {rse_time}
+      {time_spent_vs_saved}
+    </body>
+    '''
+
+    with stats.phase('serialize'), atomic_write(args.output, 'w') as f:
+        f.write(template.format(**figures))
+
+
+def prepare(data, year=None):
+    """Parse the times of (a chunk of) report.csv, and filter by year."""
     # Parse the timestamps, which includes timezone information. To make sure
     # all times are in the same timezone, we first convert everything to UTC
     # and then to Finnish time (EET).
@@ -14,119 +109,174 @@ def report(args):
     data.time = pd.to_datetime(data.time, utc=True).tz_convert('EET')
 
     # Filter data by date
-    if args.year is not None:
-        date_mask = data['time'].map(lambda date: date.year) <= args.year
-        date_mask &= data['time'].map(lambda date: date.year) >= args.year
+    if year is not None:
+        date_mask = data['time'].map(lambda date: date.year) <= year
+        date_mask &= data['time'].map(lambda date: date.year) >= year
         data = data[date_mask]
+    return data
+
+
+def aggregate(data):
+    """Compute the frames behind each figure from the report.csv data.
+
+    Returns a dict with one frame for each of FIGURES.
+    """
+    return _finish(_partial(data))
+
+
+def aggregate_chunks(chunks):
+    """Like aggregate(), but from an iterable of pieces of the data.
+
+    Only the sums of each piece are kept, so memory use does not depend on
+    the length of the data.
+    """
+    parts = None
+    for data in chunks:
+        sums = _partial(data)
+        if parts is None:
+            parts = sums
+            continue
+        # Fold into the running sums
+        parts = dict(
+            unit=pd.concat([parts['unit'], sums['unit']]).groupby(level=0).sum(),
+            unit_month=pd.concat([parts['unit_month'], sums['unit_month']]).groupby(level=[0, 1]).sum(),
+            author_unit=pd.concat([parts['author_unit'], sums['author_unit']]).groupby(level=[0, 1]).sum(),
+            iid=pd.concat([parts['iid'], sums['iid']]).groupby(level=0).agg(IID_SUMS),
+            )
+    return _finish(parts)
 
-    RSEs = set([col.split(' by ')[1] for col in data.columns
-                if ' by ' in col])
-    KPIs = set([col.split(' by ')[0] for col in data.columns
-                if ' by ' in col and not col.startswith('Time spent')])
 
+# Per-project sums for time spent vs. saved.  Use the last date mentioned in
+# the project as representative date.
+IID_SUMS = {
+    'time': 'max',
+    'time_spent': 'sum',
+    'timesaved': 'sum',
+}
+
+
+def _partial(data):
+    """Sums of the data, which can be added up over pieces of the data."""
+    return dict(
+        unit=data.groupby('unit')['time_spent'].agg('sum'),
+        unit_month=data.groupby(['unit', pd.Grouper(key='time', freq=MONTH, label='left')])['time_spent'].agg('sum'),
+        author_unit=data.groupby(['author', 'unit'])['time_spent'].agg('sum'),
+        iid=data.groupby('iid')[list(IID_SUMS)].agg(IID_SUMS),
+        )
+
+
+def _finish(parts):
+    """The frames of the figures, from the sums of _partial()."""
     # Compute time spent per unit
-    time_per_unit = data.groupby('unit')[['time_spent']].agg('sum')
+    time_per_unit = parts['unit'].to_frame()
     time_per_unit = time_per_unit.sort_index()
     time_per_unit = time_per_unit.reset_index()
 
-    fig_time_per_unit = px.pie(
-        time_per_unit,
-        values='time_spent',
-        names='unit',
-        title='Time spent per unit',
-    ).to_html(include_plotlyjs=False, full_html=False, default_width=400,
-              default_height=400)
-
     # Compute time spent per unit, per-month
-    time_per_unit_per_month = data.groupby(['unit', pd.Grouper(freq='M', label='left')])[['time_spent']].agg('sum')
-    print(time_per_unit_per_month)
-    print(time_per_unit_per_month.columns)
-    print(time_per_unit_per_month['time_spent'])
+    time_per_unit_per_month = parts['unit_month'].to_frame()
     time_per_unit_per_month = time_per_unit_per_month.sort_index()
     time_per_unit_per_month = time_per_unit_per_month.reset_index()
     time_per_unit_per_month['time_spent'] /= (60 * 60 * 8)  # 8-hour work days
 
-    fig_time_per_unit_per_month = px.bar(
-        time_per_unit_per_month,
-        x='time',
-        y='time_spent',
-        color='unit',
-        barmode='group',
-        title='Time spent per unit per month',
-        labels=dict(time_spent='time spent (days)', time='month'),
-    ).to_html(include_plotlyjs=False, full_html=False, default_width=1000,
-              default_height=400)
-
     # Compute how each RSE spent their time. The percentage of time dedicated
     # to each unit.
-    rse_time = data.groupby(['author', 'unit']).agg('sum')['time_spent']
+    rse_time = parts['author_unit'].copy()
     rse_time /= rse_time.groupby('author').transform('sum')
     rse_time *= 100
     rse_time = rse_time.reset_index()
     rse_time.columns = ['RSE', 'Unit', 'Time spent (%)']
     rse_time = rse_time.sort_values(['RSE', 'Unit'])
 
-    fig_rse_time = px.bar(
-        rse_time,
-        x="RSE",
-        y="Time spent (%)",
-        color="Unit",
-        title="Time spent by each RSE"
-    ).to_html(include_plotlyjs=False, full_html=False, default_width=600,
-              default_height=400)
-
     # Compute time spent vs. time saved
     # First, only select project that have a value for time saved
-    projects_with_time_saved = data.groupby('iid').agg('sum').query('`timesaved` > 0').index
-    time_spent_vs_saved = data[data.iid.isin(projects_with_time_saved)]
-
-    # Compute the total time spent and saved for each group.
-    # Use the last date mentioned in the project as representative date.
-    time_spent_vs_saved = time_spent_vs_saved.reset_index()[['iid', 'time', 'time_spent', 'timesaved']]
-    time_spent_vs_saved.columns = ['iid', 'time', 'time spent', 'time saved']
-    time_spent_vs_saved_groups = time_spent_vs_saved.groupby('iid')
-    time_spent_vs_saved = time_spent_vs_saved_groups.agg({
-        'time': 'max',
-        'time spent': 'sum',
-        'time saved': 'sum',
-    })
+    time_spent_vs_saved = parts['iid'][parts['iid']['timesaved'] > 0]
+    time_spent_vs_saved = time_spent_vs_saved[['time', 'time_spent', 'timesaved']]
+    time_spent_vs_saved.columns = ['time', 'time spent', 'time saved']
     time_spent_vs_saved = time_spent_vs_saved.sort_values('time')
 
     # Compute cumulative sum over time and convert time into hours
     time_spent_vs_saved['time spent'] = time_spent_vs_saved['time spent'].cumsum() / (60 * 60)
     time_spent_vs_saved['time saved'] = time_spent_vs_saved['time saved'].cumsum() / (60 * 60)
 
-    fig_time_spent_vs_saved = px.line(
-        time_spent_vs_saved.melt('time').sort_values('time'),
-        x='time',
-        y='value',
-        color='variable',
-        line_group='variable',
-        title="Time spent vs. time saved (for projects that track this information)",
-        labels=dict(time='date', value='time spent and saved (hours)'),
-    ).to_html(include_plotlyjs=False, full_html=False, default_width=600,
-              default_height=400)
+    return dict(
+        time_per_unit=time_per_unit,
+        time_per_unit_per_month=time_per_unit_per_month,
+        rse_time=rse_time,
+        time_spent_vs_saved=time_spent_vs_saved.melt('time').sort_values('time'),
+    )
 
 
-    template = r'''
-    <html>
-    <head>
-      <meta charset="utf-8" />
-      <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-    </head>
-    <body>
-      <h1>RSE statistics</h1>
-      {time_per_unit}
-      {time_per_unit_per_month}
-      {rse_time}
-      {time_spent_vs_saved}
-    </body>
-    '''
+def render(name, frame):
+    """Render one of FIGURES from its frame to an HTML fragment."""
+    kind, kwargs, html_kwargs = FIGURES[name]
+    fig = getattr(px, kind)(frame, **kwargs)
+    return fig.to_html(include_plotlyjs=False, full_html=False, **html_kwargs)
+
+
+def _cache_key(name, frame):
+    """Hash of everything a rendered figure depends on."""
+    h = hashlib.sha256()
+    h.update(repr((name, FIGURES[name], plotly.__version__)).encode())
+    h.update(repr(list(zip(frame.columns, map(str, frame.dtypes)))).encode())
+    h.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def _prune_cache(cache_dir, keep):
+    """Remove all but the `keep` most recently used figures of the cache."""
+    entries = [ ]
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.html'):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+    for _, path in sorted(entries, reverse=True)[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def render_all(frames, jobs=None, cache_dir=None, cache_size=CACHE_SIZE):
+    """Render all figures, in parallel processes.
+
+    jobs: number of processes, by default one per figure (up to the number
+    of CPUs).  With jobs=1, everything is rendered in this process.
+    cache_dir: if given, rendered figures are stored here, keyed by a hash of
+    their frame, and only figures whose frame changed are rendered again.
+    cache_size: the number of figures to keep in cache_dir.  The least
+    recently used ones are removed.
+
+    Returns a dict name -> HTML fragment.
+    """
+    figures = { }
+    keys = { }
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        for name, frame in frames.items():
+            keys[name] = _cache_key(name, frame)
+            try:
+                filename = os.path.join(cache_dir, keys[name] + '.html')
+                with open(filename) as f:
+                    figures[name] = f.read()
+                os.utime(filename)
+            except FileNotFoundError:
+                pass
+
+    missing = [name for name in frames if name not in figures]
+    jobs = jobs or min(len(missing), os.cpu_count() or 1)
+    if jobs <= 1 or len(missing) <= 1:
+        rendered = [render(name, frames[name]) for name in missing]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            rendered = list(pool.map(render, missing, [frames[name] for name in missing]))
 
-    with open(args.output, 'w') as f:
-        f.write(template.format(
-            time_per_unit=fig_time_per_unit,
-            time_per_unit_per_month=fig_time_per_unit_per_month,
-            rse_time=fig_rse_time,
-            time_spent_vs_saved=fig_time_spent_vs_saved,
-        ))
+    for name, html in zip(missing, rendered):
+        figures[name] = html
+        if cache_dir:
+            with atomic_write(os.path.join(cache_dir, keys[name] + '.html'), 'w') as f:
+                f.write(html)
+    if cache_dir:
+        _prune_cache(cache_dir, cache_size)
+    return figures
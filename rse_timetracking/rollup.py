@@ -0,0 +1,177 @@
+"""
+Rollup cube of time spent: seconds by period x spender x funding x unit, at
+day and month grain.
+
+Most reports only need sums like "hours per funding source per month", which
+can be looked up from the cube instead of grouping all time-spent records
+again.  The cube is maintained incrementally: re-applying the projects only
+recomputes the cells of projects which were updated (Project.time_updated,
+the updated_at of Gitlab) or whose funding/unit labels or number of
+time-spent records changed.
+"""
+import pickle
+from collections import defaultdict
+
+import pytz
+
+from .atomic import atomic_write
+
+TZ = pytz.timezone('Europe/Helsinki')
+
+# Grain -> strftime format of the period key.  These match the 'yearmonth'
+# column of df_timespent.
+GRAINS = dict(day='%Y-%m-%d', month='%Y-%m')
+
+DIMENSIONS = ('period', 'spender', 'funding', 'unit')
+
+
+class Rollup():
+    """Sums of time spent, keyed by (period, spender, funding, unit).
+
+    cells[grain] is a dict of these keys -> seconds.  For lookups, the keys
+    are also indexed by the value of each dimension, and the results of
+    total() are kept up to date once asked for.
+    """
+    def __init__(self):
+        self.cells = {grain: defaultdict(float) for grain in GRAINS}
+        # iid -> (time_updated, funding, unit, n_records, contribution),
+        # where contribution is a dict (grain, key) -> seconds.  This is what
+        # is needed to take a project back out of the cube.
+        self._projects = { }
+        self._build_indexes()
+
+    def _build_indexes(self):
+        # grain -> dimension -> value -> set of keys
+        self._keys = {grain: [defaultdict(set) for _ in DIMENSIONS] for grain in GRAINS}
+        # (grain, by) -> dict of total()
+        self._totals = { }
+        for grain, cells in self.cells.items():
+            for key in cells:
+                for dim, value in enumerate(key):
+                    self._keys[grain][dim][value].add(key)
+
+    def __getstate__(self):
+        # The indexes are rebuilt on load
+        return dict(cells=self.cells, _projects=self._projects)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_indexes()
+
+    def update(self, projects):
+        """Bring the cube up to date with a list of projects.
+
+        Returns the number of projects whose cells changed.
+        """
+        changed = 0
+        seen = set()
+        for p in projects:
+            seen.add(p.iid)
+            if self._update_project(p):
+                changed += 1
+        # Projects which no longer exist
+        for iid in set(self._projects) - seen:
+            self._apply(self._projects.pop(iid)[4], -1)
+            changed += 1
+        return changed
+
+    def _update_project(self, p):
+        records = p.time_spent_list
+        state = (p.time_updated, p.funding, p.unit, len(records))
+        old = self._projects.get(p.iid)
+        if old is not None:
+            # Without time_updated we can not tell, so it is always updated
+            if p.time_updated is not None and old[:4] == state:
+                return False
+            self._apply(old[4], -1)
+        contribution = self._contribution(records, p.funding, p.unit)
+        self._apply(contribution, +1)
+        self._projects[p.iid] = state + (contribution, )
+        return True
+
+    @staticmethod
+    def _contribution(records, funding, unit):
+        contribution = defaultdict(float)
+        for iid, time_spentat, spender, timespent in records:
+            time_spentat = time_spentat.astimezone(TZ)
+            for grain, fmt in GRAINS.items():
+                key = (time_spentat.strftime(fmt), spender, funding, unit)
+                contribution[grain, key] += timespent.total_seconds()
+        return dict(contribution)
+
+    def _apply(self, contribution, sign):
+        for (grain, key), seconds in contribution.items():
+            cells = self.cells[grain]
+            if key not in cells:
+                for dim, value in enumerate(key):
+                    self._keys[grain][dim][value].add(key)
+            cells[key] += sign * seconds
+            for (total_grain, by), totals in self._totals.items():
+                if total_grain == grain:
+                    group = tuple(key[DIMENSIONS.index(dim)] for dim in by)
+                    totals[group] = totals.get(group, 0) + sign * seconds
+                    if totals[group] == 0:
+                        del totals[group]
+            if cells[key] == 0:
+                del cells[key]
+                for dim, value in enumerate(key):
+                    keys = self._keys[grain][dim][value]
+                    keys.discard(key)
+                    if not keys:
+                        del self._keys[grain][dim][value]
+
+    def get(self, grain, period=None, spender=None, funding=None, unit=None):
+        """Total seconds of all cells matching the given dimensions.
+
+        Dimensions which are not given (None) are summed over.  Only the
+        cells with all given values are visited.
+        """
+        want = (period, spender, funding, unit)
+        cells = self.cells[grain]
+        if None not in want:
+            return cells.get(want, 0)
+        given = [self._keys[grain][dim].get(value, set())
+                 for dim, value in enumerate(want) if value is not None]
+        if not given:
+            return sum(cells.values())
+        keys = set.intersection(*sorted(given, key=len))
+        return sum(cells[key] for key in keys)
+
+    def total(self, grain, by):
+        """Sums over all but the given dimensions, e.g. by=('period', 'funding').
+
+        Returns a dict of tuples of the `by` dimensions -> seconds.  The first
+        call for a grain and `by` sums all cells, and the result is then kept
+        up to date by update().
+        """
+        by = tuple(by)
+        totals = self._totals.get((grain, by))
+        if totals is None:
+            idx = [DIMENSIONS.index(dim) for dim in by]
+            totals = defaultdict(float)
+            for key, seconds in self.cells[grain].items():
+                totals[tuple(key[i] for i in idx)] += seconds
+            totals = self._totals[grain, by] = dict(totals)
+        return dict(totals)
+
+    def frame(self, grain):
+        """The cells of one grain as a DataFrame with a timespent_s column."""
+        import pandas as pd
+        return pd.DataFrame(
+            [key + (seconds,) for key, seconds in sorted(
+                self.cells[grain].items(), key=lambda x: tuple(str(k) for k in x[0]))],
+            columns=list(DIMENSIONS) + ['timespent_s'],
+            )
+
+    def save(self, filename):
+        with atomic_write(filename) as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, filename):
+        """Load a saved cube, or return an empty one if the file does not exist."""
+        try:
+            with open(filename, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return cls()
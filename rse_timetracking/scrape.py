@@ -2,22 +2,29 @@
 Scrape version.aalto.fi to assemble statistics about RSE projects. For each
 project, Key Performance Indicators (KPIs) are gathered from the issue tracker.
 """
+import os
 import sys
 from collections import defaultdict
-import dateutil
-import pytz
-
-import gitlab
-import pandas as pd
 
 from .time import time_to_seconds, parse_time_spent
 from .kpis import parse_KPIs
-
-TZ = pytz.timezone('Europe/Helsinki')
+from .instrument import Stats
+from .labels import classify
+from .atomic import atomic_write
 
 
 def scrape(args):
     """Main function that serves as the entrypoint to rse_timetracking."""
+    # Imported here, since the package imports this module (for
+    # rse_timetracking.scrape) and should start fast
+    import dateutil.parser
+    import gitlab
+    import pandas as pd
+    import pytz
+    from . import partition
+    TZ = pytz.timezone('Europe/Helsinki')
+
+    stats = Stats()
 
     # Try to connect to gitlab
     gitlab_cfg_msg = """
@@ -40,15 +47,18 @@ def scrape(args):
     except gitlab.config.ConfigError as err:
         sys.exit(f'{gitlab_cfg_msg}\n'
                  f'The error message that was raised was: {err}')
+    stats.attach(gl)
 
     try:
-        gl.auth()
+        with stats.phase('connect'):
+            gl.auth()
     except gitlab.GitlabAuthenticationError as err:
         sys.exit(f'Could not login to {gl.url}. Are you sure the access token '
                  f'is correct?\nThe error message that was raised was: {err}')
 
     # Find the correct repo
-    repo = gl.search('projects', args.repo)
+    with stats.phase('connect'):
+        repo = gl.search('projects', args.repo)
     if len(repo) == 0:
         sys.exit(f'Could not find {args.repo} on {gl.url}.')
     elif len(repo) > 1:
@@ -58,76 +68,40 @@ def scrape(args):
             f'{repos}\nPlease use a more specific repository name.'
         )
     else:
-        repo = gl.projects.get(repo[0]['id'])
+        with stats.phase('connect'):
+            repo = gl.projects.get(repo[0]['id'])
 
     issue_records = []
 
-    for issue in repo.issues.list(all=True):
-        # Get some data from the labels
-        unit = []
-        funding = []
-        status = []
-        for label in issue.labels:
-            try:
-                namespace, content = label.split('::')
+    with stats.phase('list issues'):
+        issues = repo.issues.list(all=True)
+
+    for issue in issues:
+        with stats.phase('parse'):
+            # Get some data from the labels
+            unit = []
+            funding = []
+            status = []
+            for label in issue.labels:
+                namespace, content = classify(label)
                 if namespace == "Unit":
                     unit.append(content)
                 elif namespace == "Funding":
                     funding.append(content)
                 elif namespace == "Status":
                     status.append(content)
-            except ValueError:
-                # Label doesn't follow namespace::content pattern
-                pass
-        # There should be only one of these, but this isn't enforced.
-        # But in case there is more than one, pass all through so that
-        # errors don't pass silently.
-        unit = '-'.join(unit)
-        funding = '-'.join(funding)
-        status = '-'.join(status)
-        if funding == '':
-            funding = 'Unknown'
-
-        #import IPython ; IPython.embed()
-        issue_record = dict(
-            iid=issue.iid,
-            project=issue.title,
-            unit=unit,
-            funding=funding,
-            state=issue.state,
-            status=status,
-            # above common for all rows, bottom specific
-            time_created=dateutil.parser.parse(issue.created_at),
-            time=dateutil.parser.parse(issue.created_at),
-            assignee=",".join(x['username'] for x in issue.assignees),
-            time_estimate=issue.time_stats()['time_estimate'],
-            total_time_spent=issue.time_stats()['total_time_spent'],
-        )
-        issue_records.append(issue_record)
-
-
-        print(f'{issue.iid:03d} {issue.title[:75]:<75}', flush=True)
-        for note in sorted(issue.notes.list(all=True), key=lambda x: x.created_at):
-            created_at = dateutil.parser.parse(note.created_at)
-            # The "removed time spent" removes ALL past time spent on the
-            # issue, but those notes stay there including the time spent.  So
-            # we have to go edit all of the past issues and mark them as
-            # time_spent=0.
-            if note.body == 'removed time spent':
-                for old_row in issue_records:
-                    if old_row['iid'] == issue.iid:
-                        old_row['time_spent'] = 0
-            # Check the note for time spent
-            time_spent_parts = parse_time_spent(note.body)
-            if time_spent_parts is not None:
-                time_spent = time_to_seconds(*time_spent_parts[:2])
-                if time_spent_parts[2]:
-                    created_at = TZ.localize(dateutil.parser.parse(time_spent_parts[2]))
-            else:
-                time_spent = 0
-                #print(note.body)
-
-            # Issue number, time spent, time saved, etc.
+            # There should be only one of these, but this isn't enforced.
+            # But in case there is more than one, pass all through so that
+            # errors don't pass silently.
+            unit = '-'.join(unit)
+            funding = '-'.join(funding)
+            status = '-'.join(status)
+            if funding == '':
+                funding = 'Unknown'
+
+            with stats.phase('time_stats'):
+                time_stats = issue.time_stats()
+            #import IPython ; IPython.embed()
             issue_record = dict(
                 iid=issue.iid,
                 project=issue.title,
@@ -136,23 +110,72 @@ def scrape(args):
                 state=issue.state,
                 status=status,
                 # above common for all rows, bottom specific
-                time=created_at,
-                author=note.author['name'],
-                time_spent=time_spent,
-                is_closed=note.body == 'closed',
-                # TODO: switching status to re-opened
+                time_created=dateutil.parser.parse(issue.created_at),
+                time=dateutil.parser.parse(issue.created_at),
+                assignee=",".join(x['username'] for x in issue.assignees),
+                time_estimate=time_stats['time_estimate'],
+                total_time_spent=time_stats['total_time_spent'],
             )
-
-            # Check KPIs
-            for KPI_parts in parse_KPIs(note.body):
-                KPI_name, KPI_value = KPI_parts
-                issue_record[KPI_name] = KPI_value
-
             issue_records.append(issue_record)
 
 
-    data = pd.DataFrame(issue_records)
-    data.to_csv(args.output, index=False)
+            print(f'{issue.iid:03d} {issue.title[:75]:<75}', flush=True)
+            with stats.phase('fetch notes'):
+                notes = issue.notes.list(all=True)
+            for note in sorted(notes, key=lambda x: x.created_at):
+                created_at = dateutil.parser.parse(note.created_at)
+                # The "removed time spent" removes ALL past time spent on the
+                # issue, but those notes stay there including the time spent.  So
+                # we have to go edit all of the past issues and mark them as
+                # time_spent=0.
+                if note.body == 'removed time spent':
+                    for old_row in issue_records:
+                        if old_row['iid'] == issue.iid:
+                            old_row['time_spent'] = 0
+                # Check the note for time spent
+                time_spent_parts = parse_time_spent(note.body)
+                if time_spent_parts is not None:
+                    time_spent = time_to_seconds(*time_spent_parts[:2])
+                    if time_spent_parts[2]:
+                        created_at = TZ.localize(dateutil.parser.parse(time_spent_parts[2]))
+                else:
+                    time_spent = 0
+                    #print(note.body)
+
+                # Issue number, time spent, time saved, etc.
+                issue_record = dict(
+                    iid=issue.iid,
+                    project=issue.title,
+                    unit=unit,
+                    funding=funding,
+                    state=issue.state,
+                    status=status,
+                    # above common for all rows, bottom specific
+                    time=created_at,
+                    author=note.author['name'],
+                    time_spent=time_spent,
+                    is_closed=note.body == 'closed',
+                    # TODO: switching status to re-opened
+                )
+
+                # Check KPIs
+                for KPI_parts in parse_KPIs(note.body):
+                    KPI_name, KPI_value = KPI_parts
+                    issue_record[KPI_name] = KPI_value
+
+                issue_records.append(issue_record)
+
+
+    with stats.phase('serialize'):
+        data = pd.DataFrame(issue_records)
+        if os.path.isdir(args.output):
+            partition.save_csv(data, args.output)
+        else:
+            with atomic_write(args.output, 'w') as f:
+                data.to_csv(f, index=False)
 
     # Thank you and goodbye!
     print(f'\nData was written to: {args.output}')
+    stats.summary()
+    if args.trace:
+        stats.write_trace(args.trace)
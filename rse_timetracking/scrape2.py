@@ -4,9 +4,13 @@ project, Key Performance Indicators (KPIs) are gathered from the issue tracker.
 """
 import sys
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
 import dateutil
+import gzip
+import io
 import itertools
+import os
 import pickle
 import statistics
 
@@ -16,9 +20,25 @@ import gitlab
 from .time import time_to_seconds, parse_time_spent
 from . import kpis
 from .objects import Project
+from .instrument import Stats
+from .rollup import Rollup
+from .labels import classify
+from .activity import intervals
+from . import partition
+from .atomic import atomic_write
 
 TZ = pytz.timezone('Europe/Helsinki')
 
+# Label namespace -> Project attribute listing the values
+LABEL_LISTS = dict(
+    Unit='unit_list',
+    Size='size_list',
+    Funding='funding_list',
+    Status='status_list',
+    Task='task_list',
+    Imp='importance_list',
+    )
+
 
 def parse_body(p, body, created_at=None):
     # Check KPIs
@@ -37,9 +57,12 @@ def parse_body(p, body, created_at=None):
 
 
 
-def scrape2(args):
-    """Main function that serves as the entrypoint to rse_timetracking."""
+def connect(args, stats):
+    """Connect to Gitlab and find the repository.
 
+    Returns (gl, repo): the python-gitlab connection (with the stats
+    attached) and the project object of the repository.
+    """
     # Try to connect to gitlab
     gitlab_cfg_msg = """
     Could not connect to Gitlab.
@@ -61,15 +84,18 @@ def scrape2(args):
     except gitlab.config.ConfigError as err:
         sys.exit(f'{gitlab_cfg_msg}\n'
                  f'The error message that was raised was: {err}')
+    stats.attach(gl)
 
     try:
-        gl.auth()
+        with stats.phase('connect'):
+            gl.auth()
     except gitlab.GitlabAuthenticationError as err:
         sys.exit(f'Could not login to {gl.url}. Are you sure the access token '
                  f'is correct?\nThe error message that was raised was: {err}')
 
     # Find the correct repo
-    repo = gl.search('projects', args.repo)
+    with stats.phase('connect'):
+        repo = gl.search('projects', args.repo)
     if len(repo) == 0:
         sys.exit(f'Could not find {args.repo} on {gl.url}.')
     elif len(repo) > 1:
@@ -79,112 +105,376 @@ def scrape2(args):
             f'{repos}\nPlease use a more specific repository name.'
         )
     else:
-        repo = gl.projects.get(repo[0]['id'])
-
-    projects = [ ]
-
-    for issue in repo.issues.list(all=True):
-        print(f'{issue.iid:03d} {issue.title[:75]:<75}', flush=True)
-        p = Project()
-        p.iid = issue.iid
-        p.title = issue.title
-        p.state = issue.state
-        p.time_created = dateutil.parser.parse(issue.created_at)
-        p.time_updated = dateutil.parser.parse(issue.updated_at)
-        p.time_due     = dateutil.parser.parse(issue.due_date) if issue.due_date else None
-        p.timeestimate = timedelta(seconds=issue.time_stats()['time_estimate'])
-        p.timeestimate_s = issue.time_stats()['time_estimate']
-        p.timespent = timedelta(seconds=issue.time_stats()['total_time_spent'])
-        p.timespent_s = seconds=issue.time_stats()['total_time_spent']
-        p.assignee = ",".join(x['username'] for x in issue.assignees)
-
-        # Get some data from the labels
-        for label in issue.labels:
-            #print(label)
-            if '::' in label:
-                namespace, value = label.split('::')
-                if namespace == "Unit":
-                    p.unit_list.append(value)
-                    continue
-                elif namespace == "Size":
-                    p.size_list.append(value)
-                    continue
-                elif namespace == "Funding":
-                    p.funding_list.append(value)
-                    continue
-                elif namespace == "Status":
-                    p.status_list.append(value)
-                    continue
-            elif ':' in label:
-                key, value = label.split(':')
-                if key == 'Task':
-                    p.task_list.append(value)
-                    continue
-                if key == 'Imp':
-                    p.importance_list.append(value)
-                    continue
-            p.label_list.append(label)
-
-        parse_body(p, issue.description)
-
-        note_creation_times = [ p.time_created.year ]
-        for note in sorted(issue.notes.list(all=True), key=lambda x: x.created_at):
-            created_at = dateutil.parser.parse(note.created_at)
-            # The "removed time spent" removes ALL past time spent on the
-            # issue, but those notes stay there including the time spent.  So
-            # we have to go edit all of the past issues and mark them as
-            # time_spent=0.
-            if note.body == 'removed time spent':
-                p.time_spent_list = [ ]
-            # Check the note for time spent
-            time_spent_parts = parse_time_spent(note.body)
-            if time_spent_parts is not None:
-                time_spent = time_to_seconds(*time_spent_parts[:2])
-                if time_spent_parts[2]:
-                    created_at = TZ.localize(dateutil.parser.parse(time_spent_parts[2]))
-
-                p.time_spent_list.append(
-                    (p.iid, created_at, note.author['name'], timedelta(seconds=time_spent))
-                    )
-
-            parse_body(p, note.body, created_at=created_at)
-            if note.body and note.body.strip().split()[0] not in {'assigned', 'changed', 'subtracted'} and note.body.strip()[0] != '/':
-                if len(note.body)<80: print(repr(note.body))
-                note_creation_times.append(created_at.year)
-        p.year = statistics.median_low(note_creation_times)
-
-        projects.append(p)
-
-
-    open(args.output, 'wb').write(pickle.dumps(projects))
+        with stats.phase('connect'):
+            repo = gl.projects.get(repo[0]['id'])
+    return gl, repo
+
+
+def scrape2(args):
+    """Main function that serves as the entrypoint to rse_timetracking."""
+    stats = Stats()
+    gl, repo = connect(args, stats)
+
+    with stats.phase('list issues'):
+        issues = repo.issues.list(all=True)
+
+    with IssueParser(args.jobs) as parser:
+        for issue in issues:
+            print(f'{issue.iid:03d} {issue.title[:75]:<75}', flush=True)
+            with stats.phase('time_stats'):
+                time_stats = issue.time_stats()
+            with stats.phase('fetch notes'):
+                notes = issue.notes.list(all=True)
+            with stats.phase('parse'):
+                parser.submit(issue.attributes, time_stats,
+                              [note.attributes for note in notes])
+        with stats.phase('parse'):
+            projects = parser.results()
+
+    with stats.phase('serialize'):
+        save(projects, args.output)
 
     # Thank you and goodbye!
     print(f'\nData was written to: {args.output}')
+    stats.summary()
+    if args.trace:
+        stats.write_trace(args.trace)
 
 
-def load(input):
-    return _load(open(input, 'rb').read())
+class IssueParser():
+    """Runs parse_issue() on issues as they are fetched.
 
-def _load(data):
-    projects = pickle.loads(data)
-    return projects
+    With jobs > 1, the issues are parsed in a pool of processes while the
+    next ones are fetched.  results() gives the Projects in the order the
+    issues were submitted.
+
+        with IssueParser(jobs) as parser:
+            for issue, time_stats, notes in ...:
+                parser.submit(issue, time_stats, notes)
+            projects = parser.results()
+    """
+    def __init__(self, jobs=1):
+        self.pool = ProcessPoolExecutor(jobs) if jobs and jobs > 1 else None
+        self.items = [ ]    # Projects, or futures of them
+
+    def submit(self, issue, time_stats, notes):
+        if self.pool is None:
+            self.items.append(parse_issue(issue, time_stats, notes))
+        else:
+            self.items.append(self.pool.submit(parse_issue, issue, time_stats, notes))
+
+    def results(self):
+        if self.pool is None:
+            return self.items
+        return [_intern(f.result()) for f in self.items]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+
+_tzinfos = { }
+
+
+def _shared_tz(time):
+    """The datetime with the same tzinfo object as all equal ones."""
+    if time is None or time.tzinfo is None:
+        return time
+    # dateutil's tzutc is not hashable, and is copied by pickle
+    tz = _tzinfos.setdefault((type(time.tzinfo), repr(time.tzinfo)), time.tzinfo)
+    return time if tz is time.tzinfo else time.replace(tzinfo=tz)
+
+
+def _intern(p):
+    """Share the strings and time zones of a Project parsed in another process.
+
+    Interned strings (see labels.py), KPI names and time zones come back from
+    the pool as separate copies for each project.  This makes all projects
+    share one object per value again, which keeps the saved file as small as
+    without the pool.
+    """
+    for name in list(LABEL_LISTS.values()) + ['label_list']:
+        setattr(p, name, [sys.intern(value) for value in getattr(p, name)])
+    p.time_created = _shared_tz(p.time_created)
+    p.time_updated = _shared_tz(p.time_updated)
+    p.time_due = _shared_tz(p.time_due)
+    p.time_spent_list = [(iid, _shared_tz(time), sys.intern(spender), timespent)
+                         for iid, time, spender, timespent in p.time_spent_list]
+    p.kpi_list = [(sys.intern(name), value, _shared_tz(time))
+                  for name, value, time in p.kpi_list]
+    p.metadata_list = [(sys.intern(name), value, _shared_tz(time))
+                       for name, value, time in p.metadata_list]
+    p.event_list = [(sys.intern(event), _shared_tz(time)) for event, time in p.event_list]
+    return p
+
+
+def parse_issue(issue, time_stats, notes):
+    """Build a Project from an issue, its time stats and its notes.
+
+    All arguments are plain data as returned by the Gitlab REST API: issue
+    and time_stats are dicts, notes is a list of dicts.  Other sources
+    (GraphQL, project exports) are converted to this form.
+    """
+    p = Project()
+    p.iid = issue['iid']
+    p.title = issue['title']
+    p.state = issue['state']
+    p.time_created = dateutil.parser.parse(issue['created_at'])
+    p.time_updated = dateutil.parser.parse(issue['updated_at'])
+    p.time_due     = dateutil.parser.parse(issue['due_date']) if issue['due_date'] else None
+    p.timeestimate = timedelta(seconds=time_stats['time_estimate'])
+    p.timeestimate_s = time_stats['time_estimate']
+    p.timespent = timedelta(seconds=time_stats['total_time_spent'])
+    p.timespent_s = time_stats['total_time_spent']
+    p.assignee = ",".join(x['username'] for x in issue['assignees'])
+
+    # Get some data from the labels
+    for label in issue['labels']:
+        namespace, value = classify(label)
+        getattr(p, LABEL_LISTS.get(namespace, 'label_list')).append(value)
+
+    parse_body(p, issue['description'] or '')
+
+    note_creation_times = [ p.time_created.year ]
+    for note in sorted(notes, key=lambda x: x['created_at']):
+        body = note['body']
+        created_at = parse_note(p, note)
+        if body and body.strip().split()[0] not in {'assigned', 'changed', 'subtracted'} and body.strip()[0] != '/':
+            if len(body)<80: print(repr(body))
+            note_creation_times.append(created_at.year)
+    p.year = statistics.median_low(note_creation_times)
+    return p
+
+
+def parse_note(p, note):
+    """Apply one note (a dict as returned by the REST API) to a Project.
+
+    Returns the time of the note, or the date of the time spent if it was
+    given.
+    """
+    body = note['body']
+    created_at = dateutil.parser.parse(note['created_at'])
+    # The "removed time spent" removes ALL past time spent on the
+    # issue, but those notes stay there including the time spent.  So
+    # we have to go edit all of the past issues and mark them as
+    # time_spent=0.
+    if body == 'removed time spent':
+        p.time_spent_list = [ ]
+    # Closing and reopening, also "closed via merge request !12".  Only
+    # system notes, not comments which happen to start with the word.
+    event = body.split(' ', 1)[0] if body and note.get('system') else None
+    if event in ('closed', 'reopened'):
+        p.event_list.append((event, created_at))
+    # Check the note for time spent
+    time_spent_parts = parse_time_spent(body)
+    if time_spent_parts is not None:
+        time_spent = time_to_seconds(*time_spent_parts[:2])
+        if time_spent_parts[2]:
+            created_at = TZ.localize(dateutil.parser.parse(time_spent_parts[2]))
+
+        p.time_spent_list.append(
+            (p.iid, created_at, sys.intern(note['author']['name']), timedelta(seconds=time_spent))
+            )
 
-import pandas as pd
-def dataframes(projects):
+    parse_body(p, body, created_at=created_at)
+    return created_at
+
+
+# The saved file starts with a header line: MAGIC, the format version and
+# the compression, e.g. b'rse-timetracking 1 zstd\n'.  Then comes the
+# compressed pickle (protocol 5) of the list of projects.  Files without the
+# header are plain pickles, from older versions.
+MAGIC = b'rse-timetracking'
+FORMAT_VERSION = 1
+
+
+def _compressions():
+    """Available compressions: name -> (writer, reader) of file objects."""
+    compressions = { }
+    try:
+        import zstandard
+        compressions['zstd'] = (
+            lambda f: zstandard.ZstdCompressor(level=10).stream_writer(f, closefd=False),
+            lambda f: io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f)),
+            )
+    except ImportError:
+        pass
+    try:
+        import lz4.frame
+        compressions['lz4'] = (
+            lambda f: lz4.frame.LZ4FrameFile(f, 'wb'),
+            lambda f: lz4.frame.LZ4FrameFile(f, 'rb'),
+            )
+    except ImportError:
+        pass
+    compressions['gzip'] = (
+        lambda f: gzip.GzipFile(fileobj=f, mode='wb', compresslevel=6),
+        lambda f: gzip.GzipFile(fileobj=f, mode='rb'),
+        )
+    return compressions
+
+
+def save(projects, output, compression=None):
+    """Write the list of projects to the output file.
+
+    If output is a directory, it is written partitioned by year (see
+    partition.py).
+
+    compression: 'zstd', 'lz4' or 'gzip'.  By default the first of these
+    which is installed (gzip always is).
+    """
+    if os.path.isdir(output):
+        return partition.save_projects(projects, output, compression)
+    compressions = _compressions()
+    compression = compression or next(iter(compressions))
+    with atomic_write(output) as f:
+        f.write(b'%s %d %s\n' % (MAGIC, FORMAT_VERSION, compression.encode()))
+        with compressions[compression][0](f) as stream:
+            pickle.dump(projects, stream, protocol=5)
+
+
+def load(input, year=None, start=None, end=None):
+    """Read the list of projects from a file written by save().
+
+    year, or start and end (dates): only the projects active in this period
+    (those of the year, see Project.year, or with time spent in it), with
+    only the time spent in it.  From a partitioned directory, only the
+    partitions of the period are read.
+    """
+    start, end = partition.date_range(year, start, end)
+    if os.path.isdir(input):
+        return partition.load_projects(input, start, end)
+    with open(input, 'rb') as f:
+        projects = _load_file(f, input)
+    return partition.filter_projects(projects, start, end)
+
+
+def _load(data):
+    return _load_file(io.BytesIO(data))
+
+
+def _load_file(f, name='data'):
+    header = f.readline(256)
+    if not header.startswith(MAGIC + b' '):
+        # A plain pickle from an older version
+        f.seek(0)
+        return pickle.load(f)
+    _, version, compression = header.decode().split()
+    if int(version) > FORMAT_VERSION:
+        sys.exit(f'{name} is in format version {version}, which is newer than '
+                 f'this version of rse_timetracking.  Please upgrade.')
+    compressions = _compressions()
+    if compression not in compressions:
+        sys.exit(f'{name} is compressed with {compression}, which is not '
+                 f'installed.  Install it with: pip install '
+                 f'{dict(zstd="zstandard").get(compression, compression)}')
+    with compressions[compression][1](f) as stream:
+        return pickle.load(stream)
+
+
+# Text columns of the dataframes, which can be given a more compact dtype
+STRING_COLUMNS = dict(
+    df_projects=['title', 'assignee', 'unit', 'funding', 'size', 'status', 'imp'],
+    df_timespent=['spender'],
+    df_tasks=['task'],
+    df_kpis=['kpi_name'],
+    df_metadata=['metadata_name', 'metadata_value'],
+    df_labels=['label_name'],
+    )
+
+
+def _frame(rows, columns, text_columns=(), dtype=None):
+    """A DataFrame of rows (tuples), with text_columns made as dtype.
+
+    The frame is made one column at a time, and the text columns directly
+    with the dtype, instead of first as one object array of all columns
+    (a pointer per cell) and then converted.  So only one column is ever
+    held as Python objects.
+    """
+    import pandas as pd
+    if dtype is None or not rows:
+        df = pd.DataFrame(rows, columns=columns)
+        _set_dtype(df, text_columns, dtype)
+        return df
+    df = pd.DataFrame(index=pd.RangeIndex(len(rows)))
+    for i, column in enumerate(columns):
+        if column in text_columns:
+            if dtype == 'category':
+                df[column] = _categorical(row[i] for row in rows)
+            else:
+                df[column] = pd.array([row[i] for row in rows], dtype=dtype)
+        else:
+            df[column] = [row[i] for row in rows]
+    return df
+
+
+def _categorical(values):
+    """A pd.Categorical of strings (or None), from codes counted as we go."""
+    import numpy as np
+    import pandas as pd
+    code_of = { }
+    codes = np.fromiter((-1 if value is None else code_of.setdefault(value, len(code_of))
+                         for value in values), dtype=np.int32)
+    # Sorted categories, as astype('category') makes
+    categories = sorted(code_of)
+    order = np.full(len(categories) + 1, -1, dtype=np.int32)   # [-1] stays -1
+    order[[code_of[c] for c in categories]] = np.arange(len(categories), dtype=np.int32)
+    return pd.Categorical.from_codes(order[codes], categories=categories)
+
+
+def _set_dtype(df, columns, dtype):
+    """Convert text columns of df to dtype (if given)."""
+    if dtype is not None:
+        for column in columns:
+            if column in df:    # pivots of empty frames have no columns
+                df[column] = df[column].astype(dtype)
+
+
+def dataframes(projects, rollup=None, dtype=None, year=None, start=None, end=None):
     """Convert raw dumped data into all the respective dataframes.
 
-    Returns a dict of many dataframes.
+    projects: the list of projects, or the name of a file or partitioned
+    directory to load() them from.  year, start, end: select the projects
+    and time spent of a period, as in load().
+
+    rollup: filename of a persisted Rollup cube of time spent, which is
+    updated incrementally with these projects (only changed projects touch
+    it) and saved.  By default there is no cube.  The cube is always of all
+    the projects: year, start and end do not select from it.
+
+    Returns a dict of many dataframes.  With rollup, 'df_rollup_day' and
+    'df_rollup_month' contain the time spent per period, spender, funding
+    and unit, and 'rollup' is the Rollup object itself, for direct
+    lookups.  'df_activity' has the
+    active periods of each project (end is NaT while open), see
+    activity.timeline() for counts per day.
+
+    dtype: dtype of the text columns (STRING_COLUMNS), for example
+    'category' or 'string[pyarrow]' (needs pyarrow).  The same values repeat
+    in many rows, and these take far less memory than one Python str per
+    cell, and make groupbys on them faster.  By default they are left as
+    pandas makes them.
     """
+    import pandas as pd
+    start, end = partition.date_range(year, start, end)
+    source = projects
+    if isinstance(source, (str, os.PathLike)):
+        projects = load(source, start=start, end=end)
+    else:
+        projects = partition.filter_projects(source, start, end)
     columns = ['iid', 'title', 'state', 'assignee', 'unit', 'funding', 'size', 'status', 'imp',
                'time_created', 'time_due', 'time_updated', 'year',
                #'timeestimate', 'timespent',
                'timeestimate_s',  'timespent_s',
                ]
     # Create the basic df_projects dataframe
-    df_projects = pd.DataFrame(
+    df_projects = _frame(
         [[getattr(p, name) for name in columns]
              for p in projects],
-        columns=columns,
+        columns, STRING_COLUMNS['df_projects'], dtype,
         )
 
     # Update types and structure of dataframe
@@ -201,9 +491,9 @@ def dataframes(projects):
 
     # Timespent separate accounting
     timespent_list = list(itertools.chain(*(p.time_spent_list for p in projects)))
-    df_timespent = pd.DataFrame(
+    df_timespent = _frame(
         timespent_list,
-        columns=['iid', 'time_spentat', 'spender', 'timespent'],
+        ['iid', 'time_spentat', 'spender', 'timespent'], STRING_COLUMNS['df_timespent'], dtype,
         )
     df_timespent['time_spentat'] = pd.to_datetime(df_timespent['time_spentat'], utc=True).dt.tz_convert(TZ)
     df_timespent['yearmonth'] = df_timespent['time_spentat'].dt.strftime('%Y-%m')
@@ -216,8 +506,9 @@ def dataframes(projects):
     def map_project_size(size):
         sizemap = {'0-G': 1*3600, '1-S': 2*8*3600, '2-M': 10*8*3600, '3-L': 40*8*3600, 'x-NA': 0, None: 0}
         return sizemap[size]
-    df_projects['duration_inferred_s'] = df_projects['size'].apply(map_project_size)
-    df_projects['size_d'] = df_projects['size'].apply(map_project_size) / (8*3600)
+    sizes = df_projects['size'].astype(object).where(df_projects['size'].notna(), None)
+    df_projects['duration_inferred_s'] = sizes.apply(map_project_size)
+    df_projects['size_d'] = sizes.apply(map_project_size) / (8*3600)
     df_projects.loc[df_projects['timeestimate_s']>0,                               'duration_inferred_s'] = df_projects['timeestimate_s']
     df_projects.loc[df_projects['timespent_s']>df_projects['duration_inferred_s'], 'duration_inferred_s'] = df_projects['timespent_s']
     df_projects['duration_inferred_d'] = df_projects['duration_inferred_s'] / (8*3600)
@@ -227,18 +518,18 @@ def dataframes(projects):
                           *([[p.iid, task] for task in p.task_list]
                             for p in projects)))
     #print(task_list)
-    df_tasks = pd.DataFrame(
+    df_tasks = _frame(
         task_list,
-        columns=['iid', 'task'],
+        ['iid', 'task'], STRING_COLUMNS['df_tasks'], dtype,
         )
 
     # KPIs
     kpi_list = list(itertools.chain(
                           *([(p.iid,)+kpi for kpi in p.kpi_list]
                             for p in projects)))
-    df_kpis = pd.DataFrame(
+    df_kpis = _frame(
         kpi_list,
-        columns=['iid', 'kpi_name', 'kpi_value', 'time_kpi'],
+        ['iid', 'kpi_name', 'kpi_value', 'time_kpi'], STRING_COLUMNS['df_kpis'], dtype,
         )
     df_kpis['time_kpi'] = pd.to_datetime(df_kpis['time_kpi'], utc=True).dt.tz_convert(TZ)
 
@@ -246,9 +537,9 @@ def dataframes(projects):
     metadata_list = list(itertools.chain(
                           *([(p.iid,)+kpi for kpi in p.metadata_list]
                             for p in projects)))
-    df_metadata = pd.DataFrame(
+    df_metadata = _frame(
         metadata_list,
-        columns=['iid', 'metadata_name', 'metadata_value', 'time_metadata'],
+        ['iid', 'metadata_name', 'metadata_value', 'time_metadata'], STRING_COLUMNS['df_metadata'], dtype,
         )
     df_metadata['time_metadata'] = pd.to_datetime(df_metadata['time_metadata'], utc=True).dt.tz_convert(TZ)
 
@@ -256,9 +547,9 @@ def dataframes(projects):
     label_list = list(itertools.chain(
                       *([(p.iid, label) for label in p.label_list]
                         for p in projects)))
-    df_labels = pd.DataFrame(
+    df_labels = _frame(
         label_list,
-        columns=['iid', 'label_name'],
+        ['iid', 'label_name'], STRING_COLUMNS['df_labels'], dtype,
         )
 
 
@@ -267,32 +558,66 @@ def dataframes(projects):
         df_metadata=df_metadata,
         df_labels=df_labels,
         df_kpis=df_kpis,
-        df_tasks=df_tasks)
+        df_tasks=df_tasks,
+        dtype=dtype)
+
+    # Active periods of the projects, for activity.timeline()
+    activity_list = [(p.iid, start, end, p.unit, p.funding)
+                     for p in projects for start, end in intervals(p)]
+    df_activity = pd.DataFrame(
+        activity_list,
+        columns=['iid', 'start', 'end', 'unit', 'funding'],
+        )
+    df_activity['start'] = pd.to_datetime(df_activity['start'], utc=True).dt.tz_convert(TZ)
+    df_activity['end'] = pd.to_datetime(df_activity['end'], utc=True).dt.tz_convert(TZ)
 
-    return {'df_projects': df_projects,
+    dfs = {'df_projects': df_projects,
             'df_timespent': df_timespent,
             'df_tasks': df_tasks,
             'df_kpis': df_kpis,
             'df_metadata': df_metadata,
             'df_labels': df_labels,
+            'df_activity': df_activity,
             }
 
-
-def combine_dataframes(df_projects, df_metadata=None, df_labels=None, df_kpis=None, df_tasks=None):
+    # Rollup cube of time spent
+    if rollup:
+        cube = Rollup.load(rollup)
+        # Not only those of the period, or update() would drop the others
+        if projects is not source:
+            projects = load(source) if isinstance(source, (str, os.PathLike)) else source
+        if cube.update(projects):
+            cube.save(rollup)
+        dfs.update(df_rollup_day=cube.frame('day'), df_rollup_month=cube.frame('month'),
+                   rollup=cube)
+    return dfs
+
+
+def combine_dataframes(df_projects, df_metadata=None, df_labels=None, df_kpis=None, df_tasks=None,
+                       dtype=None):
     """Combine many dataframes into a wide dataframe (format subject to change)
+
+    dtype: dtype of the added text columns (metadata, combined tasks), as
+    in dataframes().  The columns of df_projects keep their dtypes.
     """
     if df_metadata is not None:
-        _ = df_metadata.pivot_table(index='iid', aggfunc=','.join, columns='metadata_name', values='metadata_value')
+        _ = df_metadata.pivot_table(index='iid', aggfunc=_join, columns='metadata_name', values='metadata_value',
+                                    observed=True)
+        _.columns = _.columns.astype(object)
+        _set_dtype(_, _.columns, dtype)
         df_projects = df_projects.join(_, how='left', on='iid')
 
     if df_labels is not None:
         df_labels = df_labels.copy()
         df_labels['true'] = True
         _ = df_labels.pivot(index='iid', columns='label_name', values='true')
+        _.columns = _.columns.astype(object)
         df_projects = df_projects.join(_, how='left', on='iid')
 
     if df_kpis is not None:
-        _ = df_kpis.pivot_table(index='iid', columns='kpi_name', values='kpi_value', aggfunc='sum')
+        _ = df_kpis.pivot_table(index='iid', columns='kpi_name', values='kpi_value', aggfunc='sum',
+                                observed=True)
+        _.columns = _.columns.astype(object)
         _['timesaved_s'] = _.timesaved
         #_['timesaved'] = pd.to_timedelta(_.timesaved, unit='s')
         df_projects = df_projects.join(_, how='left', on='iid')
@@ -303,9 +628,16 @@ def combine_dataframes(df_projects, df_metadata=None, df_labels=None, df_kpis=No
         _ = df_tasks.copy()
         _['true'] = True
         _ = _.pivot(index='iid', columns='task', values='true')
+        _.columns = _.columns.astype(object)
         df_projects = df_projects.join(_, how='left', on='iid')
         # all combined
-        _ = df_tasks.pivot_table(index='iid', values='task', aggfunc=','.join)
+        _ = df_tasks.pivot_table(index='iid', values='task', aggfunc=_join, observed=True)
+        _set_dtype(_, ['task'], dtype)
         df_projects = df_projects.join(_, how='left', on='iid')
 
     return df_projects
+
+
+def _join(values):
+    """','.join() that also works on categorical values."""
+    return ','.join(map(str, values))
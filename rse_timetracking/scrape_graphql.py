@@ -0,0 +1,141 @@
+"""
+Scrape the projects through the Gitlab GraphQL API.
+
+The REST scrapers need at least one request for the issue list plus one or
+two per issue (notes, time stats).  With GraphQL, issues come in pages
+together with their labels, assignees, time tracking and notes, so a full
+scrape takes a few dozen requests.  The result is the same list of Project
+objects as scrape2.scrape2() makes.
+"""
+from .instrument import Stats
+from .scrape2 import connect, IssueParser, save
+
+# Gitlab limits the complexity of queries, which limits the page sizes
+ISSUES_PER_PAGE = 50
+NOTES_PER_PAGE = 100
+
+NOTE_FIELDS = '''
+          pageInfo { hasNextPage endCursor }
+          nodes { body system createdAt author { name } }
+'''
+
+ISSUES_QUERY = '''
+query($path: ID!, $after: String) {
+  project(fullPath: $path) {
+    issues(first: %d, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        iid title state description createdAt updatedAt dueDate
+        timeEstimate totalTimeSpent
+        assignees { nodes { username } }
+        labels(first: 100) { nodes { title } }
+        notes(first: %d) { %s }
+      }
+    }
+  }
+}
+''' % (ISSUES_PER_PAGE, NOTES_PER_PAGE, NOTE_FIELDS)
+
+# For the rare issue with more notes than fit in the first page
+NOTES_QUERY = '''
+query($path: ID!, $iid: String!, $after: String) {
+  project(fullPath: $path) {
+    issue(iid: $iid) {
+      notes(first: %d, after: $after) { %s }
+    }
+  }
+}
+''' % (NOTES_PER_PAGE, NOTE_FIELDS)
+
+
+def scrape_graphql(args):
+    """Entrypoint of `scrape --v2 --graphql`."""
+    stats = Stats()
+    gl, repo = connect(args, stats)
+
+    def post(query, variables):
+        with stats.phase('graphql'):
+            return graphql_request(gl, query, variables)
+
+    with IssueParser(args.jobs) as parser:
+        for issue, time_stats, notes in fetch_issues(post, repo.path_with_namespace):
+            print(f'{issue["iid"]:03d} {issue["title"][:75]:<75}', flush=True)
+            with stats.phase('parse'):
+                parser.submit(issue, time_stats, notes)
+        with stats.phase('parse'):
+            projects = parser.results()
+
+    with stats.phase('serialize'):
+        save(projects, args.output)
+
+    # Thank you and goodbye!
+    print(f'\nData was written to: {args.output}')
+    stats.summary()
+    if args.trace:
+        stats.write_trace(args.trace)
+
+
+def graphql_request(gl, query, variables):
+    """Run one GraphQL query with the session and token of python-gitlab."""
+    response = gl.session.post(
+        gl.url.rstrip('/') + '/api/graphql',
+        json=dict(query=query, variables=variables),
+        headers=gl.headers,
+        timeout=gl.timeout,
+        )
+    response.raise_for_status()
+    result = response.json()
+    if result.get('errors'):
+        raise RuntimeError(f'GraphQL query failed: {result["errors"]}')
+    return result['data']
+
+
+def fetch_issues(post, path):
+    """Page through all issues of a project.
+
+    post(query, variables) runs a query and returns its 'data'.  Yields
+    (issue, time_stats, notes) in the same form as the REST API returns
+    them, ready for scrape2.parse_issue().
+    """
+    after = None
+    while True:
+        data = post(ISSUES_QUERY, dict(path=path, after=after))
+        issues = data['project']['issues']
+        for node in issues['nodes']:
+            notes = node['notes']
+            note_nodes = list(notes['nodes'])
+            while notes['pageInfo']['hasNextPage']:
+                data = post(NOTES_QUERY, dict(path=path, iid=node['iid'],
+                                              after=notes['pageInfo']['endCursor']))
+                notes = data['project']['issue']['notes']
+                note_nodes.extend(notes['nodes'])
+            yield _rest_issue(node), _rest_time_stats(node), [_rest_note(n) for n in note_nodes]
+        if not issues['pageInfo']['hasNextPage']:
+            break
+        after = issues['pageInfo']['endCursor']
+
+
+def _rest_issue(node):
+    return dict(
+        iid=int(node['iid']),
+        title=node['title'],
+        state=node['state'],
+        description=node['description'],
+        created_at=node['createdAt'],
+        updated_at=node['updatedAt'],
+        due_date=node['dueDate'],
+        assignees=[dict(username=a['username']) for a in node['assignees']['nodes']],
+        labels=[label['title'] for label in node['labels']['nodes']],
+        )
+
+
+def _rest_time_stats(node):
+    return dict(time_estimate=node['timeEstimate'] or 0,
+                total_time_spent=node['totalTimeSpent'] or 0)
+
+
+def _rest_note(node):
+    # The author of notes by deleted users can be missing
+    author = node['author'] or dict(name='Ghost User')
+    return dict(body=node['body'], system=node.get('system'), created_at=node['createdAt'],
+                author=dict(name=author['name']))
@@ -0,0 +1,205 @@
+"""
+A local web server for the report, with filters by year, unit and RSE.
+
+`serve` reads report.csv (or a `scrape --partition` directory) once, and
+keeps only its sums per month, unit, RSE and project.  This is the finest
+grain which the filters and figures need, and is much smaller than the
+data.  Each page is made by report.aggregate() of the rows of these sums
+which match its filters, and is kept so that coming back to the same
+filters is instant.  The data is read again only when it changes (for
+example, after a new scrape).
+
+    rse_timetracking serve -i report.csv --port 8000
+"""
+import html
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import pandas as pd
+
+from .instrument import Stats
+from . import partition
+from .report import COLUMNS, FIGURES, IID_SUMS, prepare, aggregate, render_all
+
+FILTERS = ('year', 'unit', 'rse')
+
+# Sums of report.csv kept by serve: these keys, and the columns of IID_SUMS
+GRAIN = ['unit', 'author', 'iid', 'month']
+
+PAGE = r'''
+<html>
+<head>
+  <meta charset="utf-8" />
+  <title>RSE statistics</title>
+  <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+</head>
+<body>
+  <h1>RSE statistics</h1>
+  <form method="get" action="/">
+    {selects}
+    <input type="submit" value="Show" />
+  </form>
+  {figures}
+</body>
+'''
+
+
+def read(input):
+    """The report.csv data of a file or a partitioned directory."""
+    files = partition.csv_files(input) if os.path.isdir(input) else [input]
+    return pd.concat([pd.read_csv(f, usecols=COLUMNS) for f in files], ignore_index=True)
+
+
+def pre_aggregate(data):
+    """Sums of the prepared report.csv data per GRAIN, with a year column.
+
+    report.aggregate() of the rows of these gives the same as of the rows of
+    the data they come from: every figure sums time_spent and timesaved,
+    and takes the latest time, over groups which are unions of these.
+    """
+    time = data['time']
+    month = time.dt.year * 12 + time.dt.month - 1
+    sums = (data.assign(month=month)
+            .groupby(GRAIN, dropna=False, sort=False)[list(IID_SUMS)]
+            .agg(IID_SUMS)
+            .reset_index())
+    sums['year'] = sums['time'].dt.year
+    return sums.drop(columns='month')
+
+
+class Dashboard():
+    """The data of one report.csv, and the pages made from it.
+
+    pages: how many pages (filter combinations) to keep.
+    """
+    def __init__(self, input, pages=128):
+        self.input = input
+        self.max_pages = pages
+        self.lock = threading.Lock()
+        self._stamp = None
+        self._data = None
+        self._pages = OrderedDict()
+
+    def _current(self):
+        """(stamp, sums of pre_aggregate()), read again if the data changed."""
+        with self.lock:
+            stamp = partition.stamp(self.input)
+            if stamp != self._stamp:
+                stats = Stats()
+                with stats.phase('load'):
+                    data = prepare(read(self.input))
+                with stats.phase('aggregate'):
+                    self._data = pre_aggregate(data)
+                self._stamp = stamp
+                self._pages.clear()
+            return self._stamp, self._data
+
+    def data(self):
+        """The sums of pre_aggregate(), read again if the data changed."""
+        return self._current()[1]
+
+    def options(self, data):
+        """Values for each filter."""
+        return dict(
+            year=sorted(data['year'].dropna().unique()),
+            unit=sorted(data['unit'].dropna().unique()),
+            rse=sorted(data['author'].dropna().unique()),
+            )
+
+    def page(self, year=None, unit=None, rse=None):
+        """The HTML page of the report with the given filters."""
+        stamp, data = self._current()
+        key = (stamp, year, unit, rse)
+        with self.lock:
+            if key in self._pages:
+                self._pages.move_to_end(key)
+                return self._pages[key]
+
+        mask = pd.Series(True, index=data.index)
+        if year is not None:
+            mask &= data['year'] == year
+        if unit is not None:
+            mask &= data['unit'] == unit
+        if rse is not None:
+            mask &= data['author'] == rse
+        selected = data[mask]
+        if selected['time_spent'].sum() > 0:
+            # One Stats per page, since pages are made in many threads
+            stats = Stats()
+            with stats.phase('aggregate'):
+                frames = aggregate(selected)
+            with stats.phase('render'):
+                figures = render_all(frames, jobs=1)
+            figures = '\n'.join(figures[name] for name in FIGURES)
+        else:
+            figures = '<p>No time spent with these filters.</p>'
+
+        current = dict(year=year, unit=unit, rse=rse)
+        selects = [ ]
+        for name, values in self.options(data).items():
+            options = ['<option value="">all</option>'] + [
+                f'<option{" selected" if value == current[name] else ""}>'
+                f'{html.escape(str(value))}</option>'
+                for value in values]
+            selects.append(f'<label>{name} <select name="{name}">{"".join(options)}'
+                           f'</select></label>')
+        page = PAGE.format(selects='\n    '.join(selects), figures=figures)
+
+        with self.lock:
+            # Not if the data was read again meanwhile
+            if stamp == self._stamp:
+                self._pages[key] = page
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return page
+
+
+def parse_filters(query):
+    """URL query string -> keyword arguments of Dashboard.page()."""
+    values = {name: value[0] for name, value in parse_qs(query).items()
+              if name in FILTERS and value[0]}
+    if 'year' in values:
+        values['year'] = int(values['year'])
+    return values
+
+
+def make_server(dashboard, host='127.0.0.1', port=8000):
+    """An HTTP server showing the pages of the dashboard."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != '/':
+                return self._reply(404, 'Not found')
+            try:
+                filters = parse_filters(url.query)
+            except ValueError:
+                return self._reply(400, 'Invalid year')
+            self._reply(200, dashboard.page(**filters))
+
+        def _reply(self, status, text):
+            body = text.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def serve(args):
+    """Entrypoint of the `serve` subcommand."""
+    dashboard = Dashboard(args.input)
+    dashboard.data()
+    server = make_server(dashboard, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f'Serving the report of {args.input} at http://{host}:{port}/', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,205 @@
+"""
+Keep a scraped project file up to date from Gitlab webhooks.
+
+`serve-webhook` runs a small HTTP server which receives the "Issues events"
+and "Comments" webhooks of the repository (Settings → Webhooks), applies each
+event to the projects (the same file as made by `scrape --v2`) and writes
+them back in batches.  This keeps the data fresh without scraping.
+
+Limitations, coming from what Gitlab sends:
+
+- Time spent comes from the total_time_spent change of issue events.  The
+  date given with /spend is not included, so the time of the event is used.
+- The year of a project (median year of its comments) is not updated.
+"""
+import json
+import os
+import sys
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import dateutil
+
+from .scrape2 import load, save, parse_issue, parse_note
+
+
+class Store():
+    """The projects, by iid, with batched writes back to the file.
+
+    The file is written when `batch` changes are pending, and at latest
+    every `interval` seconds.
+    """
+    def __init__(self, input, output=None, batch=20, interval=10.0):
+        self.output = output or input
+        self.batch = batch
+        self.projects = { }
+        if os.path.exists(input):
+            self.projects = {p.iid: p for p in load(input)}
+        self.pending = 0
+        self.lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._timer = threading.Thread(target=self._run_timer, args=(interval,),
+                                       daemon=True)
+        self._timer.start()
+
+    def apply(self, event, payload):
+        """Apply one webhook event.  Returns True if a project changed."""
+        with self.lock:
+            changed = apply_event(self.projects, event, payload)
+            if changed:
+                self.pending += 1
+            if self.pending >= self.batch:
+                self._flush()
+        return changed
+
+    def flush(self):
+        """Write the projects, if anything changed."""
+        with self.lock:
+            if self.pending:
+                self._flush()
+
+    def _flush(self):
+        save(list(self.projects.values()), self.output)
+        self.pending = 0
+
+    def _run_timer(self, interval):
+        while not self._stopped.wait(interval):
+            self.flush()
+
+    def close(self):
+        self._stopped.set()
+        self.flush()
+
+
+def apply_event(projects, event, payload):
+    """Apply a webhook payload to the dict iid -> Project.
+
+    event is the X-Gitlab-Event header.  Returns True if a project changed.
+    """
+    if event == 'Issue Hook':
+        apply_issue(projects, payload)
+        return True
+    if event == 'Note Hook':
+        return apply_note(projects, payload)
+    return False
+
+
+def _rest_issue(attrs, labels, assignees):
+    """Issue attributes of a webhook to (issue, time_stats) for parse_issue()."""
+    issue = dict(
+        iid=attrs['iid'],
+        title=attrs['title'],
+        state=attrs['state'],
+        description=attrs.get('description'),
+        created_at=attrs['created_at'],
+        updated_at=attrs['updated_at'],
+        due_date=attrs.get('due_date'),
+        labels=[label['title'] for label in labels],
+        assignees=[dict(username=a['username']) for a in assignees],
+        )
+    time_stats = dict(time_estimate=attrs.get('time_estimate') or 0,
+                      total_time_spent=attrs.get('total_time_spent') or 0)
+    return issue, time_stats
+
+
+def apply_issue(projects, payload):
+    """Apply an issue event: new issue, or changed fields and time spent."""
+    attrs = payload['object_attributes']
+    issue, time_stats = _rest_issue(attrs, payload.get('labels', [ ]),
+                                    payload.get('assignees', [ ]))
+    p = parse_issue(issue, time_stats, [ ])
+    old = projects.get(p.iid)
+    if old is not None:
+        # Keep what came from the comments.  Items from the description have
+        # no time, and are parsed again from the new description.
+        p.time_spent_list = old.time_spent_list
+        p.kpi_list += [k for k in old.kpi_list if k[2] is not None]
+        p.metadata_list += [m for m in old.metadata_list if m[2] is not None]
+        p.year = old.year
+        p.event_list = getattr(old, 'event_list', [ ])
+    action = dict(close='closed', reopen='reopened').get(attrs.get('action'))
+    if action:
+        p.event_list.append((action, dateutil.parser.parse(attrs['updated_at'])))
+    change = payload.get('changes', { }).get('total_time_spent')
+    if change:
+        previous, current = change.get('previous') or 0, change.get('current') or 0
+        if current == 0:
+            # "removed time spent"
+            p.time_spent_list = [ ]
+        elif current != previous:
+            p.time_spent_list.append(
+                (p.iid, dateutil.parser.parse(attrs['updated_at']),
+                 sys.intern(payload['user']['name']),
+                 timedelta(seconds=current - previous)))
+    projects[p.iid] = p
+
+
+def apply_note(projects, payload):
+    """Apply a comment on an issue (KPIs, metadata, time spent)."""
+    attrs = payload['object_attributes']
+    if attrs.get('noteable_type') != 'Issue':
+        return False
+    issue = payload['issue']
+    p = projects.get(issue['iid'])
+    if p is None:
+        p = parse_issue(*_rest_issue(issue, issue.get('labels', [ ]), [ ]), [ ])
+        projects[p.iid] = p
+    parse_note(p, dict(body=attrs['note'], system=attrs.get('system'),
+                       created_at=attrs['created_at'],
+                       author=dict(name=payload['user']['name'])))
+    # As Gitlab does, so that rollup.Rollup sees the change
+    p.time_updated = dateutil.parser.parse(attrs.get('updated_at') or attrs['created_at'])
+    return True
+
+
+def make_server(store, host='127.0.0.1', port=8765, secret=None):
+    """An HTTP server applying the webhooks it receives to the store.
+
+    secret: if given, requests need it in the X-Gitlab-Token header (the
+    "Secret token" of the Gitlab webhook).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if secret is not None and self.headers.get('X-Gitlab-Token') != secret:
+                return self._reply(403, dict(error='invalid token'))
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                payload = json.loads(self.rfile.read(length))
+            except ValueError as err:
+                return self._reply(400, dict(error=f'invalid JSON: {err}'))
+            event = self.headers.get('X-Gitlab-Event', '')
+            try:
+                changed = store.apply(event, payload)
+            except (KeyError, TypeError, ValueError, RuntimeError) as err:
+                print(f'Could not apply {event}: {err!r}', file=sys.stderr)
+                return self._reply(422, dict(error=repr(err)))
+            self._reply(200, dict(applied=changed))
+
+        def _reply(self, status, data):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def serve_webhook(args):
+    """Entrypoint of the `serve-webhook` subcommand."""
+    store = Store(args.input, args.output, batch=args.batch, interval=args.interval)
+    server = make_server(store, args.host, args.port,
+                         secret=args.secret or os.environ.get('WEBHOOK_SECRET'))
+    host, port = server.server_address[:2]
+    print(f'Receiving Gitlab webhooks at http://{host}:{port}/, '
+          f'{len(store.projects)} projects in {store.output}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        store.close()
+        print(f'\nData was written to: {store.output}')
@@ -18,7 +18,7 @@ setuptools.setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.9',  # shutdown(cancel_futures=), tracemalloc.reset_peak()
     install_requires=[
         'altair[all]',
         'ipywidgets',
@@ -31,6 +31,9 @@ setuptools.setup(
         'requests',
         'tabulate', # for making markdown tables
         ],
+    extras_require=dict(
+        compression=['zstandard'],  # smaller and faster than gzip for scrape --v2 files
+        ),
     entry_points=dict(
         console_scripts=['rse-timetracking=rse_timetracking:main.main'],
     )
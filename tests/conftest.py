@@ -0,0 +1,45 @@
+"""
+Fixtures shared by the tests.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from rse_timetracking.objects import Project
+
+TZ = pytz.timezone('Europe/Helsinki')
+
+
+def _time(when):
+    """A (year, month, day[, hour]) tuple in Helsinki time, or a datetime as is."""
+    return when if isinstance(when, datetime) else TZ.localize(datetime(*when))
+
+
+def _make_project(iid, unit=None, funding=None, year=None, records=(), events=(), **attrs):
+    p = Project()
+    p.iid = iid
+    p.title = f'Project {iid}'
+    p.unit_list = [unit] if unit else [ ]
+    p.funding_list = [funding] if funding else [ ]
+    p.year = year
+    p.time_spent_list = [(iid, _time(when), spender, timedelta(hours=hours))
+                         for when, spender, hours in records]
+    p.event_list = [(event, _time(when)) for event, when in events]
+    for name, value in attrs.items():
+        setattr(p, name, value)
+    return p
+
+
+@pytest.fixture
+def make_project():
+    """Build a Project.
+
+    records: (time, spender, hours) of time spent, and events: (event,
+    time), where a time is a (year, month, day[, hour]) tuple in Helsinki
+    time or a datetime.  Other keyword arguments set attributes, e.g.
+    state='closed' or label_list=[...].
+
+        make_project(1, unit='CS', funding='Unit', records=[((2021, 1, 5), 'Ada', 2)])
+    """
+    return _make_project
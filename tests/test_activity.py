@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from rse_timetracking import activity
+from rse_timetracking.objects import Project
+from rse_timetracking.scrape2 import parse_note
+
+
+def day(*date):
+    return activity.TZ.localize(datetime(*date, 12))
+
+
+@pytest.fixture
+def project(make_project):
+    """A project created on a day, with events and time spent at noon."""
+    def project(iid, unit, created, state='opened', events=(), spent=()):
+        return make_project(iid, unit=unit, state=state,
+                            time_created=day(*created), time_updated=day(*created),
+                            events=[(event, day(*date)) for event, date in events],
+                            records=[(day(*date), 'Ada', 1) for date in spent])
+    return project
+
+
+def test_intervals(project):
+    """Test the active periods from events and time spent."""
+    p = project(1, 'CS', (2021, 1, 1), state='closed',
+                events=[('closed', (2021, 1, 10)), ('reopened', (2021, 2, 1)),
+                        ('closed', (2021, 2, 5))],
+                spent=[(2021, 2, 8)])
+    assert activity.intervals(p) == [(day(2021, 1, 1), day(2021, 1, 10)),
+                                     (day(2021, 2, 1), day(2021, 2, 8))]
+    p = project(2, 'CS', (2021, 1, 1), spent=[(2020, 12, 30)])
+    assert activity.intervals(p) == [(day(2020, 12, 30), None)]
+
+
+def test_timeline(project):
+    """Test counting active projects per day, compared to checking each day."""
+    projects = [
+        project(1, 'CS', (2021, 1, 1), state='closed', events=[('closed', (2021, 1, 10))]),
+        project(2, 'CS', (2021, 1, 5), state='closed',
+                events=[('closed', (2021, 1, 6)), ('reopened', (2021, 1, 8)),
+                        ('closed', (2021, 1, 12))]),
+        project(3, 'NBE', (2021, 1, 3), state='closed', events=[('closed', (2021, 1, 3))]),
+        ]
+    df_activity = pd.DataFrame(
+        [(p.iid, start, end, p.unit) for p in projects for start, end in activity.intervals(p)],
+        columns=['iid', 'start', 'end', 'unit'])
+    counts = activity.timeline(df_activity, by='unit', start='2020-12-30', end='2021-01-15')
+    assert list(counts.columns) == ['CS', 'NBE']
+    assert len(counts) == 17
+    for d in counts.index:
+        for unit in counts.columns:
+            expected = sum(1 for p in projects if p.unit == unit
+                           for start, end in activity.intervals(p)
+                           if start.date() <= d.date() <= end.date())
+            assert counts.loc[d, unit] == expected, (d, unit)
+    total = activity.timeline(df_activity, end='2021-01-15')
+    assert total['active'].max() == 2
+    assert total.index[0] == pd.Timestamp('2021-01-01')
+    assert activity.timeline(df_activity.iloc[:0], by='unit').empty
+
+
+def test_events():
+    """Test that only system notes close and reopen projects."""
+    p = Project()
+    for body, system in (('closed', True), ('closed the ticket with the customer', False),
+                         ('reopened', None), ('closed via merge request !12', True)):
+        parse_note(p, dict(body=body, system=system, created_at='2021-01-05T10:00:00Z',
+                           author=dict(name='Ada Lovelace')))
+    assert [event for event, time in p.event_list] == ['closed', 'closed']
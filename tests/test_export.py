@@ -0,0 +1,58 @@
+import io
+import json
+import tarfile
+
+from rse_timetracking.export import read_export
+from rse_timetracking.scrape2 import parse_issue
+
+ISSUE = dict(
+    iid=3, title='Project 3', state='opened', description='/summary Something',
+    created_at='2021-02-01T10:00:00.000Z', updated_at='2021-02-06T10:00:00.000Z',
+    due_date='2021-05-01', time_estimate=7200,
+    label_links=[dict(label=dict(title='Unit::CS')), dict(label=dict(title='Funding::ASC'))],
+    issue_assignees=[dict(user_id=7)],
+    timelogs=[dict(time_spent=3600, spent_at='2021-02-04T00:00:00.000Z', user_id=7)],
+    notes=[
+        dict(note='added 1h of time spent at 2021-02-04', system=True,
+             created_at='2021-02-04T10:00:00.000Z', author=dict(name='Ada Lovelace')),
+        dict(note='/projects 2', system=False,
+             created_at='2021-02-05T10:00:00.000Z', author=dict(name='Ada Lovelace')),
+        ],
+    )
+
+
+def add(tar, name, lines):
+    data = ''.join(json.dumps(line) + '\n' for line in lines).encode()
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def test_read_export(tmp_path):
+    """Test reading issues from a project export archive."""
+    archive = tmp_path / 'export.tar.gz'
+    with tarfile.open(archive, 'w:gz') as tar:
+        add(tar, './VERSION', [ ])
+        add(tar, './tree/project/issues.ndjson', [ISSUE, dict(ISSUE, iid=4, notes=[ ])])
+        add(tar, './tree/project/project_members.ndjson',
+            [dict(user=dict(id=7, username='ada'))])
+
+    projects = read_export(str(archive))
+    assert [p.iid for p in projects] == [3, 4]
+
+    # The same as from the REST API
+    rest = parse_issue(
+        dict(iid=3, title='Project 3', state='opened', description='/summary Something',
+             created_at='2021-02-01T10:00:00.000Z', updated_at='2021-02-06T10:00:00.000Z',
+             due_date='2021-05-01', labels=['Unit::CS', 'Funding::ASC'],
+             assignees=[dict(username='ada')]),
+        dict(time_estimate=7200, total_time_spent=3600),
+        [dict(body=n['note'], created_at=n['created_at'], author=n['author'])
+         for n in ISSUE['notes']])
+    assert projects[0].__dict__ == rest.__dict__
+    assert projects[0].assignee == 'ada'
+    assert projects[0].kpi_list[0][:2] == ('projects', 2)
+
+    # A file object works too
+    with open(archive, 'rb') as f:
+        assert len(read_export(f)) == 2
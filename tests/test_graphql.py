@@ -0,0 +1,71 @@
+from rse_timetracking.scrape2 import parse_issue
+from rse_timetracking.scrape_graphql import ISSUES_QUERY, NOTES_QUERY, fetch_issues
+
+
+def page(nodes, end=None):
+    return dict(pageInfo=dict(hasNextPage=end is not None, endCursor=end), nodes=nodes)
+
+
+NOTE1 = dict(body='added 1h of time spent at 2021-02-04', createdAt='2021-02-04T10:00:00Z',
+             author=dict(name='Ada Lovelace'))
+NOTE2 = dict(body='/timesaved 2d', createdAt='2021-02-05T10:00:00Z',
+             author=dict(name='Ada Lovelace'))
+NOTE3 = dict(body='closed', system=True, createdAt='2021-02-06T10:00:00Z', author=None)
+
+
+def issue_node(iid, notes):
+    return dict(
+        iid=str(iid), title=f'Project {iid}', state='closed',
+        description='/summary A project\n/contacts a@aalto.fi, b@aalto.fi',
+        createdAt='2021-02-01T10:00:00Z', updatedAt='2021-02-06T10:00:00Z',
+        dueDate=None, timeEstimate=7200, totalTimeSpent=3600,
+        assignees=dict(nodes=[dict(username='ada')]),
+        labels=dict(nodes=[dict(title='Unit::CS'), dict(title='Funding::Project'),
+                           dict(title='Task:SwDev'), dict(title='a_Discuss')]),
+        notes=notes)
+
+
+# Recorded responses, by (query, after cursor)
+RESPONSES = {
+    (ISSUES_QUERY, None): dict(project=dict(issues=page(
+        [issue_node(2, page([NOTE1], end='n1'))], end='i1'))),
+    (NOTES_QUERY, 'n1'): dict(project=dict(issue=dict(notes=page([NOTE2, NOTE3])))),
+    (ISSUES_QUERY, 'i1'): dict(project=dict(issues=page(
+        [issue_node(1, page([]))]))),
+    }
+
+
+def test_fetch_issues():
+    """Test paging through issues and notes, and building projects from them."""
+    requests = [ ]
+
+    def post(query, variables):
+        assert variables['path'] == 'AaltoRSE/rse-projects'
+        requests.append((query, variables['after']))
+        return RESPONSES[query, variables['after']]
+
+    result = list(fetch_issues(post, 'AaltoRSE/rse-projects'))
+    assert requests == list(RESPONSES)
+    assert [issue['iid'] for issue, _, _ in result] == [2, 1]
+
+    issue, time_stats, notes = result[0]
+    assert time_stats == dict(time_estimate=7200, total_time_spent=3600)
+    assert [n['body'] for n in notes] == [NOTE1['body'], NOTE2['body'], 'closed']
+    assert notes[2]['author']['name'] == 'Ghost User'
+
+    # The same Project as from the REST API
+    p = parse_issue(issue, time_stats, notes)
+    rest = parse_issue(
+        dict(iid=2, title='Project 2', state='closed',
+             description='/summary A project\n/contacts a@aalto.fi, b@aalto.fi',
+             created_at='2021-02-01T10:00:00Z', updated_at='2021-02-06T10:00:00Z',
+             due_date=None, assignees=[dict(username='ada', name='Ada Lovelace')],
+             labels=['Unit::CS', 'Funding::Project', 'Task:SwDev', 'a_Discuss']),
+        dict(time_estimate=7200, total_time_spent=3600),
+        [dict(body=n['body'], system=n.get('system'), created_at=n['createdAt'],
+              author=n['author'] or dict(name='Ghost User')) for n in (NOTE1, NOTE2, NOTE3)])
+    assert p.__dict__ == rest.__dict__
+    assert p.unit == 'CS' and p.funding == 'Project' and p.task_list == ['SwDev']
+    assert p.kpi_list[0][:2] == ('timesaved', 2 * 8 * 3600)
+    assert len(p.time_spent_list) == 1
+    assert [event for event, time in p.event_list] == ['closed']
@@ -0,0 +1,102 @@
+import io
+from datetime import date
+from types import SimpleNamespace
+
+from rse_timetracking.halli import collect_hours, index_hours, write_csv
+from rse_timetracking.instrument import Stats
+from rse_timetracking.query import Index
+from rse_timetracking.scrape2 import parse_issue
+
+
+def make_issue(labels, notes):
+    """notes: (name, body[, created_at])."""
+    notes = [SimpleNamespace(author=dict(name=name), body=body,
+                             created_at=created_at[0] if created_at else '2021-03-01T12:00:00Z')
+             for name, body, *created_at in notes]
+    return SimpleNamespace(labels=labels,
+                           notes=SimpleNamespace(list=lambda all: notes))
+
+
+def test_collect_hours():
+    """Test bucketing time spent of many people in one pass."""
+    issues = [
+        make_issue(['Funding::Project', 'Unit::CS'], [
+            ('Ada', 'added 2h of time spent at 2021-03-02'),
+            ('Alan', 'added 1h of time spent at 2021-03-02'),
+            ('Ada', 'added 1h of time spent at 2021-04-01'),   # out of range
+            ('Ada', 'added 30m of time spent'),                # note date
+            ]),
+        make_issue(['Funding::Unit'], [
+            ('Ada', 'added 4h of time spent at 2021-03-02'),
+            ('Grace', 'added 1h of time spent at 2021-03-02'), # not included
+            ]),
+        ]
+    hours, fundings = collect_hours(issues, ['Ada', 'Alan'],
+                                    date(2021, 3, 1), date(2021, 3, 31), Stats())
+    assert fundings == ['Project', 'Unit']
+    assert hours[('Ada', date(2021, 3, 2))] == {'Project': 2, 'Unit': 4}
+    assert hours[('Ada', date(2021, 3, 1))] == {'Project': 0.5}
+    assert hours[('Alan', date(2021, 3, 2))] == {'Project': 1}
+    assert ('Ada', date(2021, 4, 1)) not in hours
+    assert not any(name == 'Grace' for name, day in hours)
+
+    f = io.StringIO()
+    write_csv(f, hours, fundings, ['Ada', 'Alan'], date(2021, 3, 1), date(2021, 3, 2))
+    assert f.getvalue().splitlines() == [
+        'name,date,Project,Base',
+        'Ada,2021-03-01,0.5,6.75',
+        'Ada,2021-03-02,2.0,5.25',
+        'Alan,2021-03-01,0,7.25',
+        'Alan,2021-03-02,1.0,6.25',
+        ]
+
+
+def test_index_hours(make_project):
+    """Test hours from the index of a scraped file, as from Gitlab."""
+    index = Index([
+        make_project(1, funding='Project', records=[
+            ((2021, 3, 2), 'Ada', 2), ((2021, 3, 2), 'Alan', 1), ((2021, 4, 1), 'Ada', 1)]),
+        make_project(2, funding='Unit', records=[
+            ((2021, 3, 2), 'Ada', 4), ((2021, 3, 2), 'Grace', 1)]),
+        ])
+    hours, fundings = index_hours(index, ['Ada', 'Alan'], date(2021, 3, 1), date(2021, 3, 31))
+    assert fundings == ['Project', 'Unit']
+    assert hours[('Ada', date(2021, 3, 2))] == {'Project': 2, 'Unit': 4}
+    assert hours[('Alan', date(2021, 3, 2))] == {'Project': 1}
+    assert ('Ada', date(2021, 4, 1)) not in hours
+    assert not any(name == 'Grace' for name, day in hours)
+
+    hours, fundings = index_hours(index, [ ], date(2021, 3, 1), date(2021, 3, 31))
+    assert sorted(set(name for name, day in hours)) == ['Ada', 'Alan', 'Grace']
+
+
+def test_collect_hours_as_index():
+    """Test that hours from Gitlab and from the index of the same notes agree."""
+    issues = [
+        make_issue(['Funding::Project'], [
+            ('Ada', 'added 1h of time spent', '2021-03-01T22:30:00Z'),     # 2.3. in Helsinki
+            ('Ada', 'added 2h of time spent', '2021-03-31T20:30:00Z'),     # 31.3. in Helsinki
+            ('Ada', 'added 3h of time spent', '2021-03-31T21:30:00Z'),     # 1.4. in Helsinki
+            ('Alan', 'added 1h of time spent at 2021-03-05', '2021-03-05T10:00:00Z'),
+            ]),
+        make_issue(['Funding::Unit'], [
+            ('Ada', 'added 4h of time spent at 2021-03-02', '2021-03-02T10:00:00Z'),
+            ('Alan', 'removed time spent', '2021-03-03T10:00:00Z'),
+            ('Ada', 'added 1h of time spent at 2021-03-04', '2021-03-04T10:00:00Z'),
+            ]),
+        ]
+    projects = [
+        parse_issue(
+            dict(iid=iid, title='', state='opened', description='', labels=issue.labels,
+                 created_at='2021-03-01T10:00:00Z', updated_at='2021-04-01T10:00:00Z',
+                 due_date=None, assignees=[ ]),
+            dict(time_estimate=0, total_time_spent=0),
+            [note.__dict__ for note in issue.notes.list(all=True)])
+        for iid, issue in enumerate(issues, 1)]
+    start, end = date(2021, 3, 1), date(2021, 3, 31)
+    hours, fundings = collect_hours(issues, [ ], start, end, Stats())
+    assert (hours, fundings) == index_hours(Index(projects), [ ], start, end)
+    assert hours[('Ada', date(2021, 3, 2))] == {'Project': 1}
+    assert hours[('Ada', date(2021, 3, 31))] == {'Project': 2}
+    assert hours[('Ada', date(2021, 3, 4))] == {'Unit': 1}
+    assert ('Ada', date(2021, 4, 1)) not in hours
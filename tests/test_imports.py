@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+# Modules which take a long time to import, and should only be imported by
+# the subcommands which need them.
+HEAVY = ['pandas', 'plotly', 'gitlab', 'dateutil', 'pytz']
+
+
+def imported_after(code):
+    """Return the heavy modules imported after running code in a new python."""
+    out = subprocess.run(
+        [sys.executable, '-c', code + '\nimport sys\n'
+         f'print("imported:" + ",".join(m for m in {HEAVY!r} if m in sys.modules))'],
+        capture_output=True, text=True, check=True)
+    line = out.stdout.split('imported:')[-1].strip()
+    return [m for m in line.split(',') if m]
+
+
+def test_import_is_light():
+    """Importing the package does not import the heavy dependencies."""
+    assert imported_after('import rse_timetracking') == []
+    assert imported_after('import rse_timetracking.main') == []
+
+
+def test_help_is_light():
+    """--help and a bad subcommand do not import the heavy dependencies."""
+    for argv in (['--help'], [], ['no-such-command']):
+        assert imported_after(
+            f'import sys; sys.argv = ["rse_timetracking", *{argv!r}]\n'
+            'from rse_timetracking.main import main\n'
+            'try:\n'
+            '    main()\n'
+            'except SystemExit:\n'
+            '    pass\n') == []
+
+
+def test_scrape_function():
+    """rse_timetracking.scrape is the scrape function, also after the
+    rse_timetracking.scrape module is imported again."""
+    assert imported_after(
+        'import rse_timetracking\n'
+        'import rse_timetracking.scrape\n'
+        'from rse_timetracking.main import main\n'
+        'assert rse_timetracking.scrape.__name__ == "scrape"\n'
+        'assert callable(rse_timetracking.scrape)') == []
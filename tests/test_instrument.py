@@ -0,0 +1,32 @@
+import json
+import time
+
+from rse_timetracking.instrument import Stats
+
+
+class FakeResponse():
+    content = b'x' * 10
+
+
+def test_phases(tmp_path):
+    """Test per-phase accounting of time and API traffic."""
+    stats = Stats()
+    with stats.phase('outer'):
+        time.sleep(0.01)
+        with stats.phase('inner'):
+            stats._on_response(FakeResponse())
+            time.sleep(0.02)
+    with stats.phase('inner'):
+        stats._on_response(FakeResponse())
+
+    assert stats.count == {'outer': 1, 'inner': 2}
+    assert stats.requests == {'inner': 2}
+    assert stats.bytes == {'inner': 20}
+    # Time of the nested phase is not counted in the outer one
+    assert stats.seconds['outer'] < 0.02
+    assert stats.seconds['inner'] >= 0.02
+
+    stats.write_trace(tmp_path / 'trace.json')
+    trace = json.load(open(tmp_path / 'trace.json'))
+    assert trace['phases']['inner']['requests'] == 2
+    assert [e['name'] for e in trace['traceEvents']] == ['inner', 'outer', 'inner']
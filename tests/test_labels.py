@@ -0,0 +1,23 @@
+from rse_timetracking.labels import classify
+
+
+def test_classify():
+    """Test classifying labels into namespaces."""
+    assert classify('Unit::CS') == ('Unit', 'CS')
+    assert classify('Funding::Project') == ('Funding', 'Project')
+    assert classify('Status::3-InProgress') == ('Status', '3-InProgress')
+    assert classify('Size::2-M') == ('Size', '2-M')
+    assert classify('Task:SwDev') == ('Task', 'SwDev')
+    assert classify('Imp:1-Urgent') == ('Imp', '1-Urgent')
+    # Not one of our namespaces
+    assert classify('a_Discuss') == (None, 'a_Discuss')
+    assert classify('Customer:FCAI') == (None, 'Customer:FCAI')
+    assert classify('Customer::FCAI') == (None, 'Customer::FCAI')
+    assert classify('Task::SwDev') == (None, 'Task::SwDev')
+    assert classify('Unit:CS') == (None, 'Unit:CS')
+    # Extra separators stay in the value
+    assert classify('Unit::CS::ML') == ('Unit', 'CS::ML')
+
+    # Values are interned
+    value = classify(''.join(['Unit::', 'NBE']))[1]
+    assert value is classify('Funding::NBE')[1]
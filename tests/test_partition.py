@@ -0,0 +1,62 @@
+from datetime import date
+
+from rse_timetracking.scrape2 import save, load
+
+
+def spent(*days):
+    """records of make_project(): an hour by Ada on each day."""
+    return [(day, 'Ada', 1) for day in days]
+
+
+def test_partitioned(tmp_path, make_project):
+    """Test that loading a period from partitions equals filtering everything."""
+    projects = [
+        make_project(1, year=2020, records=spent((2020, 5, 1), (2021, 1, 10))),
+        make_project(2, year=2021, records=spent((2021, 3, 1))),
+        make_project(3, year=2019, records=spent((2019, 12, 31))),
+        make_project(4, year=2021),
+        ]
+    save(projects, tmp_path / 'report.pkl')
+    (tmp_path / 'parts').mkdir()
+    save(projects, tmp_path / 'parts')
+    assert sorted(f.name for f in (tmp_path / 'parts' / 'v1').iterdir()) == [
+        'projects-2019.pkl', 'projects-2020.pkl', 'projects-2021.pkl',
+        'timespent-2019.pkl', 'timespent-2020.pkl', 'timespent-2021.pkl']
+    assert len(projects[0].time_spent_list) == 2
+
+    for period in (dict(), dict(year=2021), dict(year=2019),
+                   dict(start=date(2020, 1, 1), end=date(2020, 12, 31))):
+        whole = load(tmp_path / 'report.pkl', **period)
+        parts = load(tmp_path / 'parts', **period)
+        assert [p.__dict__ for p in parts] == [p.__dict__ for p in whole], period
+    assert [(p.iid, len(p.time_spent_list)) for p in load(tmp_path / 'parts', year=2021)] == [
+        (1, 1), (2, 1), (4, 0)]
+
+
+
+def test_snapshots(tmp_path, make_project):
+    """Test that each save is a new snapshot, and old ones are removed."""
+    projects = [make_project(1, year=2020, records=spent((2020, 5, 1)))]
+    for i in range(5):
+        projects[0].title = f'Version {i}'
+        save(projects, tmp_path)
+        assert load(tmp_path)[0].title == f'Version {i}'
+    assert sorted(f.name for f in tmp_path.iterdir()) == ['manifest.json', 'v3', 'v4', 'v5']
+    # A reader which read the manifest before the last save still has its files
+    assert [p.title for p in load(tmp_path / 'v4' / 'projects-2020.pkl')] == ['Version 3']
+
+
+def test_atomic_write(tmp_path, make_project):
+    """Test that a failed save leaves the old file."""
+    save([make_project(1, year=2020)], tmp_path / 'report.pkl')
+    try:
+        save([object.__new__(Unpicklable)], tmp_path / 'report.pkl')
+    except TypeError:
+        pass
+    assert [p.iid for p in load(tmp_path / 'report.pkl')] == [1]
+    assert [f.name for f in tmp_path.iterdir()] == ['report.pkl']
+
+
+class Unpicklable():
+    def __reduce__(self):
+        raise TypeError('can not pickle')
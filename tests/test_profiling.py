@@ -0,0 +1,60 @@
+import threading
+import time
+
+from rse_timetracking.instrument import Stats
+from rse_timetracking.profiling import Profiler, current_rss
+
+
+def test_profiler(tmp_path):
+    """Test memory per phase and the files written by the profiler."""
+    stats = Stats()
+    prefix = str(tmp_path / 'prof')
+    with Profiler(prefix, top=5) as profiler:
+        with stats.phase('parse'):
+            data = [bytearray(2**20) for _ in range(8)]
+            with stats.phase('serialize'):
+                del data
+    assert profiler.peak['parse'] >= 8 * 2**20
+    assert profiler.peak['total'] >= profiler.peak['parse']
+    assert list(profiler.rss) == ['serialize', 'parse', 'total']
+    assert (tmp_path / 'prof.pstats').stat().st_size > 0
+    report = (tmp_path / 'prof.alloc.txt').read_text()
+    assert 'Top 5 lines' in report
+    assert 'test_profiling.py' in report
+
+
+def test_rss_per_phase(tmp_path):
+    """Test that the RSS of a phase is not that of an earlier, larger one."""
+    stats = Stats()
+    with Profiler(str(tmp_path / 'prof')) as profiler:
+        with stats.phase('parse'):
+            data = bytearray(256 * 2**20)
+            data[::4096] = b'x' * len(data[::4096])     # make it resident
+            time.sleep(0.1)     # for the sampling thread
+            del data
+        with stats.phase('serialize'):
+            pass
+    if profiler.rss['parse'] is not None and current_rss() is not None:
+        assert profiler.rss['parse'] - profiler.rss['serialize'] > 128 * 2**20
+        assert profiler.rss['total'] >= profiler.rss['parse']
+
+
+def test_phases_per_thread(tmp_path):
+    """Test that phases in other threads do not end each other."""
+    stats = Stats()
+    inside = threading.Barrier(2)
+
+    def page(name):
+        with stats.phase(name):
+            inside.wait()       # both phases open at once
+            with stats.phase('render'):
+                pass
+
+    with Profiler(str(tmp_path / 'prof')) as profiler:
+        threads = [threading.Thread(target=page, args=(name,)) for name in ['a', 'b']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert set(profiler.rss) == {'a', 'b', 'render', 'total'}
+    assert all(not stack for stack in profiler._stacks.values())
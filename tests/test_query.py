@@ -0,0 +1,68 @@
+import pickle
+from datetime import date
+
+import pytest
+
+from rse_timetracking.query import Index, load_index, parse_kpi_filter
+
+
+@pytest.fixture
+def projects(make_project):
+    return [
+        make_project(1, unit='CS', funding='Unit',
+                     records=[((2021, 1, 5), 'Ada', 2), ((2021, 2, 1), 'Alan', 3)],
+                     kpi_list=[('timesaved', 8 * 3600, None), ('timesaved', 5 * 8 * 3600, None)]),
+        make_project(2, unit='NBE', funding='Project',
+                     records=[((2021, 1, 6), 'Ada', 4), ((2020, 12, 1), 'Ada', 1)],
+                     label_list=['a_Discuss']),
+        ]
+
+
+def test_index(projects):
+    """Test selecting projects and records through the index."""
+    index = Index(projects)
+    assert index.hours(index.select_records(), ['spender']) == {('Ada',): 7, ('Alan',): 3}
+    assert index.hours(index.select_records(
+        since=date(2021, 1, 1), until=date(2021, 1, 31)), ['funding']) == {
+            ('Unit',): 2, ('Project',): 4}
+
+    iids = index.select_projects(fundings=['Project'])
+    assert iids == {2}
+    assert index.hours(index.select_records(iids, ['Ada']), ['month']) == {
+        ('2020-12',): 1, ('2021-01',): 4}
+    assert index.select_projects(labels=['a_Discuss', 'Unit::CS']) == {1, 2}
+    assert index.select_projects(units=['CS'], labels=['a_Discuss']) == set()
+
+    assert parse_kpi_filter('timesaved>1w') == ('timesaved', '>', 5 * 8 * 3600)
+    assert index.select_projects(kpi_filters=[parse_kpi_filter('timesaved>1w')]) == {1}
+    assert index.select_projects(kpi_filters=[parse_kpi_filter('timesaved>=2w')]) == set()
+
+
+def test_load_index(tmp_path, projects):
+    """The index is saved, and rebuilt when the data changes."""
+    filename = tmp_path / 'report.pkl'
+    filename.write_bytes(pickle.dumps(projects))
+    index = load_index(filename)
+    assert (tmp_path / 'report.pkl.index').exists()
+    assert load_index(filename).source == index.source
+
+    filename.write_bytes(pickle.dumps(projects[:1]))
+    assert sorted(load_index(filename).projects) == [1]
+
+
+def test_timesheet(tmp_path, projects):
+    """Test the time spent of one person, and the index of a partitioned directory."""
+    from rse_timetracking.scrape2 import save
+    index = Index(projects)
+    assert list(index.timesheet('Ada')) == [
+        (date(2020, 12, 1), 2, 3600), (date(2021, 1, 5), 1, 7200), (date(2021, 1, 6), 2, 14400)]
+    assert list(index.timesheet('Ada', date(2021, 1, 1), date(2021, 1, 5))) == [
+        (date(2021, 1, 5), 1, 7200)]
+    assert list(index.timesheet('Nobody')) == [ ]
+
+    directory = tmp_path / 'data'
+    directory.mkdir()
+    save(projects, directory)
+    assert load_index(directory).by_spender == index.by_spender
+    assert (directory / 'index.pkl').exists()
+    assert sorted(f.name for f in tmp_path.iterdir()) == ['data']
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from rse_timetracking import report
+
+
+def make_data():
+    data = pd.DataFrame(dict(
+        iid=[1, 1, 2, 3],
+        time=['2021-01-05T10:00:00+02:00', '2021-02-01T10:00:00+02:00',
+              '2021-01-20T10:00:00+02:00', '2021-03-02T10:00:00+02:00'],
+        author=['Ada', 'Ada', 'Alan', 'Alan'],
+        unit=['CS', 'CS', 'NBE', 'CS'],
+        time_spent=[3600, 7200, 1800, 3600],
+        timesaved=[0, 36000, 0, 0],
+        ))
+    data.time = pd.to_datetime(data.time, utc=True)
+    return data
+
+
+def test_render_cache(tmp_path, monkeypatch):
+    """Test that cached figures are only rendered again when their data changes."""
+    frames = report.aggregate(make_data())
+    assert set(frames) == set(report.FIGURES)
+    first = report.render_all(frames, jobs=1, cache_dir=tmp_path)
+    assert len(list(tmp_path.iterdir())) == len(report.FIGURES)
+
+    rendered = [ ]
+    def render(name, frame):
+        rendered.append(name)
+        return 'new'
+    monkeypatch.setattr(report, 'render', render)
+    assert report.render_all(frames, jobs=1, cache_dir=tmp_path) == first
+    assert rendered == [ ]
+
+    frames['rse_time'].loc[0, 'Time spent (%)'] = 50.0
+    figures = report.render_all(frames, jobs=1, cache_dir=tmp_path)
+    assert rendered == ['rse_time']
+    assert figures['rse_time'] == 'new'
+    assert figures['time_per_unit'] == first['time_per_unit']
+
+    # The old rse_time figure is the least recently used
+    report.render_all(frames, jobs=1, cache_dir=tmp_path, cache_size=len(report.FIGURES))
+    assert len(list(tmp_path.iterdir())) == len(report.FIGURES)
+
+
+def test_aggregate_chunks():
+    """Test that aggregating in pieces gives the same frames."""
+    data = make_data()
+    frames = report.aggregate(data)
+    chunked = report.aggregate_chunks(data[i:i+1] for i in range(len(data)))
+    for name in report.FIGURES:
+        pd.testing.assert_frame_equal(chunked[name], frames[name])
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+from rse_timetracking import scrape2
+from rse_timetracking.rollup import Rollup, TZ
+
+
+def test_rollup(tmp_path, make_project):
+    """Test building and incrementally updating the rollup cube."""
+    updated = TZ.localize(datetime(2021, 3, 1))
+    p1 = make_project(1, unit='CS', funding='Unit', time_updated=updated,
+                      records=[((2021, 1, 5), 'Ada', 2),
+                               ((2021, 1, 6), 'Ada', 1),
+                               ((2021, 2, 1), 'Alan', 3)])
+    p2 = make_project(2, unit='CS', funding='Project', time_updated=updated,
+                      records=[((2021, 1, 5), 'Ada', 4)])
+    cube = Rollup()
+    assert cube.update([p1, p2]) == 2
+    assert cube.get('month', '2021-01', 'Ada') == 7 * 3600
+    assert cube.get('month', '2021-01', funding='Unit') == 3 * 3600
+    assert cube.get('day', '2021-01-05') == 6 * 3600
+    assert cube.total('month', by=('period', 'funding')) == {
+        ('2021-01', 'Unit'): 3 * 3600,
+        ('2021-01', 'Project'): 4 * 3600,
+        ('2021-02', 'Unit'): 3 * 3600,
+        }
+
+    # Nothing changed
+    cube.save(tmp_path / 'cube')
+    cube = Rollup.load(tmp_path / 'cube')
+    assert cube.update([p1, p2]) == 0
+
+    # Updated, but the cells are the same
+    p1.time_updated = TZ.localize(datetime(2021, 3, 2))
+    assert cube.update([p1, p2]) == 1
+    assert cube.get('month', '2021-01', 'Ada') == 7 * 3600
+
+    # Appended record
+    p2.time_spent_list.append(
+        (2, TZ.localize(datetime(2021, 3, 1)), 'Alan', timedelta(hours=1)))
+    assert cube.update([p1, p2]) == 1
+    assert cube.get('month', '2021-03') == 3600
+    assert cube.get('month', '2021-01', funding='Project') == 4 * 3600
+
+    # Funding changed: the project moves to other cells
+    p2.funding_list = ['Unit']
+    assert cube.update([p1, p2]) == 1
+    assert cube.get('month', funding='Project') == 0
+    assert cube.get('month', funding='Unit') == 11 * 3600
+    assert cube.total('month', by=('period', 'funding')) == {
+        ('2021-01', 'Unit'): 7 * 3600,
+        ('2021-02', 'Unit'): 3 * 3600,
+        ('2021-03', 'Unit'): 3600,
+        }
+    assert cube.get('day', '2021-01-05', 'Ada', 'Unit', 'CS') == 6 * 3600
+
+    # Time spent removed, and a project deleted
+    p1.time_spent_list = [ ]
+    assert cube.update([p1]) == 2
+    assert cube.cells['month'] == { }
+
+    df = Rollup().frame('month')
+    assert list(df.columns) == ['period', 'spender', 'funding', 'unit', 'timespent_s']
+
+
+def test_rollup_of_period(tmp_path, make_project):
+    """Test that dataframes() of a period leaves the other years in the cube."""
+    updated = TZ.localize(datetime(2022, 3, 1))
+    projects = [make_project(iid, unit='CS', funding='Unit', year=year, state='opened',
+                             time_created=TZ.localize(datetime(year, 1, 1)), time_updated=updated,
+                             kpi_list=[('timesaved', 3600, updated)],
+                             records=[((year, 1, 5), 'Ada', iid)])
+                for iid, year in [(1, 2021), (2, 2022)]]
+    filename = tmp_path / 'projects.pkl'
+    scrape2.save(projects, filename)
+    cube = tmp_path / 'cube'
+    scrape2.dataframes(projects, rollup=cube)
+    cells = dict(Rollup.load(cube).cells['month'])
+    assert len(cells) == 2
+
+    for source in [projects, filename]:
+        dfs = scrape2.dataframes(source, rollup=cube, year=2022)
+        assert list(dfs['df_projects'].index) == [2]
+        assert dict(Rollup.load(cube).cells['month']) == cells
+        assert dfs['rollup'].get('month', '2021-01') == 3600
@@ -0,0 +1,81 @@
+import pickle
+
+import pandas as pd
+
+from rse_timetracking.scrape2 import IssueParser, save, load, MAGIC, _frame
+
+
+def rest_issue(iid):
+    issue = dict(
+        iid=iid, title=f'Project {iid}', state='closed', description='/summary A project',
+        created_at='2021-02-01T10:00:00Z', updated_at='2021-02-06T10:00:00Z', due_date=None,
+        labels=['Unit::CS', 'Funding::Project', 'a_Discuss'], assignees=[dict(username='ada')],
+        )
+    time_stats = dict(time_estimate=0, total_time_spent=3600)
+    notes = [
+        dict(body='added 1h of time spent at 2021-02-04', created_at='2021-02-04T10:00:00Z',
+             author=dict(name='Ada Lovelace')),
+        dict(body='/timesaved 2d', created_at='2021-02-05T10:00:00Z',
+             author=dict(name='Ada Lovelace')),
+        dict(body='closed', system=True, created_at='2021-02-06T10:00:00Z',
+             author=dict(name='Ada Lovelace')),
+        ]
+    return issue, time_stats, notes
+
+
+def test_issue_parser():
+    """Test that parsing in a process pool gives the same projects, in order."""
+    results = { }
+    for jobs in (1, 2):
+        with IssueParser(jobs) as parser:
+            for iid in range(1, 6):
+                parser.submit(*rest_issue(iid))
+            results[jobs] = parser.results()
+    assert [p.iid for p in results[2]] == [1, 2, 3, 4, 5]
+    assert [p.__dict__ for p in results[2]] == [p.__dict__ for p in results[1]]
+    # Values are shared between projects again
+    a, b = results[2][:2]
+    assert a.unit_list[0] is b.unit_list[0]
+    assert a.time_spent_list[0][2] is b.time_spent_list[0][2]
+    assert a.time_created.tzinfo is b.time_created.tzinfo
+
+
+def test_save_load(tmp_path):
+    """Test the compressed format, and loading old plain pickles."""
+    with IssueParser() as parser:
+        parser.submit(*rest_issue(1))
+        projects = parser.results()
+    for compression in (None, 'gzip'):
+        save(projects, tmp_path / 'report.pkl', compression=compression)
+        assert (tmp_path / 'report.pkl').read_bytes().startswith(MAGIC)
+        assert [p.__dict__ for p in load(tmp_path / 'report.pkl')] == [p.__dict__ for p in projects]
+    (tmp_path / 'old.pkl').write_bytes(pickle.dumps(projects))
+    assert [p.__dict__ for p in load(tmp_path / 'old.pkl')] == [p.__dict__ for p in projects]
+
+
+def test_dataframes_dtype():
+    """Test that text columns get the dtype, also after combine_dataframes()."""
+    from rse_timetracking.scrape2 import dataframes
+    with IssueParser() as parser:
+        for iid in (1, 2):
+            parser.submit(*rest_issue(iid))
+        projects = parser.results()
+    plain = dataframes(projects)
+    dfs = dataframes(projects, dtype='category')
+    assert dfs['df_projects']['funding'].dtype == 'category'
+    assert dfs['df_projects']['summary'].dtype == 'category'
+    assert dfs['df_timespent']['spender'].dtype == 'category'
+    assert list(dfs['df_projects'].columns) == list(plain['df_projects'].columns)
+    assert list(dfs['df_projects']['summary']) == list(plain['df_projects']['summary'])
+
+
+def test_frame():
+    """Test that text columns made with a dtype equal converted ones."""
+    rows = [(1, 'CS', 'b'), (2, None, 'a'), (3, 'NBE', 'b')]
+    columns = ['iid', 'unit', 'label']
+    expected = pd.DataFrame(rows, columns=columns)
+    for dtype in ('category', 'string'):
+        df = _frame(rows, columns, ['unit', 'label'], dtype)
+        pd.testing.assert_frame_equal(df, expected.astype(dict(unit=dtype, label=dtype)))
+    pd.testing.assert_frame_equal(_frame([ ], columns, ['unit'], 'category'),
+                                  pd.DataFrame([ ], columns=columns).astype(dict(unit='category')))
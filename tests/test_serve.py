@@ -0,0 +1,45 @@
+import os
+
+import pandas as pd
+
+from rse_timetracking import partition
+from rse_timetracking.serve import Dashboard, parse_filters
+
+
+CSV = """iid,time,author,unit,time_spent,timesaved
+1,2020-12-05 10:00:00+00:00,Ada,CS,3600,0
+1,2021-02-01 10:00:00+00:00,Ada,CS,7200,36000
+2,2021-01-20 10:00:00+00:00,Alan,NBE,1800,
+"""
+
+
+def test_dashboard(tmp_path):
+    """Test filtered pages, their caching, and reloading a changed file."""
+    input = tmp_path / 'report.csv'
+    input.write_text(CSV)
+    dashboard = Dashboard(str(input))
+    page = dashboard.page(year=2021, unit='CS')
+    assert '<option selected>2021</option>' in page
+    assert '<option selected>CS</option>' in page
+    assert dashboard.page(year=2021, unit='CS') is page
+    assert 'No time spent' in dashboard.page(year=2021, rse='Nobody')
+    assert dashboard.options(dashboard.data())['rse'] == ['Ada', 'Alan']
+
+    input.write_text(CSV + '3,2021-03-01 10:00:00+00:00,Grace,PHYS,60,\n')
+    os.utime(input, ns=(0, 0))
+    assert dashboard.page(year=2021, unit='CS') is not page
+    assert dashboard.options(dashboard.data())['rse'] == ['Ada', 'Alan', 'Grace']
+
+
+def test_partitioned(tmp_path):
+    """Test serving a scrape --partition directory."""
+    (tmp_path / 'report.csv').write_text(CSV)
+    partition.save_csv(pd.read_csv(tmp_path / 'report.csv'), tmp_path)
+    dashboard = Dashboard(str(tmp_path))
+    assert dashboard.options(dashboard.data())['year'] == [2020, 2021]
+    flat = Dashboard(str(tmp_path / 'report.csv'))
+    assert dashboard.data().equals(flat.data())
+
+
+def test_parse_filters():
+    assert parse_filters('year=2021&unit=CS&rse=&other=1') == dict(year=2021, unit='CS')
@@ -0,0 +1,86 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from rse_timetracking.scrape2 import load
+from rse_timetracking.webhook import Store, make_server
+
+# Recorded webhook payloads, with the fields we do not use removed
+ISSUE_OPEN = {
+    'object_kind': 'issue',
+    'user': {'name': 'Ada Lovelace', 'username': 'ada'},
+    'object_attributes': {
+        'iid': 7, 'title': 'Data pipeline', 'state': 'opened', 'action': 'open',
+        'description': '/summary Build a pipeline\n/contacts a@aalto.fi',
+        'created_at': '2021-03-01 10:00:00 UTC', 'updated_at': '2021-03-01 10:00:00 UTC',
+        'due_date': None, 'time_estimate': 0, 'total_time_spent': 0,
+        },
+    'labels': [{'title': 'Unit::CS'}, {'title': 'Funding::Unit'}],
+    'assignees': [{'username': 'ada'}],
+    'changes': {},
+    }
+ISSUE_SPEND = {
+    'object_kind': 'issue',
+    'user': {'name': 'Ada Lovelace', 'username': 'ada'},
+    'object_attributes': dict(ISSUE_OPEN['object_attributes'], action='update',
+                              updated_at='2021-03-02 12:00:00 UTC',
+                              total_time_spent=7200),
+    'labels': [{'title': 'Unit::CS'}, {'title': 'Funding::Project'}],
+    'assignees': [{'username': 'ada'}],
+    'changes': {'total_time_spent': {'previous': 0, 'current': 7200}},
+    }
+NOTE = {
+    'object_kind': 'note',
+    'user': {'name': 'Alan Turing', 'username': 'alan'},
+    'object_attributes': {'note': '/timesaved 1w', 'noteable_type': 'Issue',
+                          'created_at': '2021-03-03 10:00:00 UTC'},
+    'issue': ISSUE_OPEN['object_attributes'],
+    }
+MR_NOTE = dict(NOTE, object_attributes=dict(NOTE['object_attributes'],
+                                            noteable_type='MergeRequest'))
+
+
+@pytest.fixture
+def server(tmp_path):
+    store = Store(str(tmp_path / 'report.pkl'), batch=3, interval=60)
+    server = make_server(store, port=0, secret='s3cret')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, store
+    server.shutdown()
+    server.server_close()
+    store.close()
+
+
+def post(server, event, payload, token='s3cret'):
+    host, port = server.server_address[:2]
+    request = urllib.request.Request(
+        f'http://{host}:{port}/', data=json.dumps(payload).encode(),
+        headers={'X-Gitlab-Event': event, 'X-Gitlab-Token': token})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def test_webhook(server, tmp_path):
+    """Test applying recorded webhook payloads, and batched writes."""
+    server, store = server
+    assert post(server, 'Issue Hook', ISSUE_OPEN) == {'applied': True}
+    assert post(server, 'Note Hook', MR_NOTE) == {'applied': False}
+    assert post(server, 'Note Hook', NOTE) == {'applied': True}
+    assert not (tmp_path / 'report.pkl').exists()   # not a full batch yet
+
+    assert post(server, 'Issue Hook', ISSUE_SPEND) == {'applied': True}
+    projects = load(tmp_path / 'report.pkl')
+    assert len(projects) == 1
+    p = projects[0]
+    assert p.iid == 7 and p.funding == 'Project' and p.unit == 'CS'
+    assert p.timespent_s == 7200
+    assert [(r[2], r[3].total_seconds()) for r in p.time_spent_list] == [('Ada Lovelace', 7200)]
+    assert [k[:2] for k in p.kpi_list] == [('timesaved', 5 * 8 * 3600)]
+    assert [m[:2] for m in p.metadata_list] == [('summary', 'Build a pipeline'),
+                                                ('contact', 'a@aalto.fi')]
+
+    with pytest.raises(urllib.error.HTTPError, match='403'):
+        post(server, 'Issue Hook', ISSUE_OPEN, token='wrong')